@@ -11,8 +11,16 @@ import base64
 repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(repo_root)
 
-# 导入你的预测器（请确保 src/predictor.py 存在且可导入）
-from src.predictor import CS2SkinPredictor
+# 导入常驻模型管理器与微批调度器（请确保 src/ 存在且可导入）
+from src.model_manager import ModelManager
+from src.scheduler import MicroBatchScheduler
+from src.forecast_cache import ForecastCache
+
+# 进程级常驻模型：只加载一次，在请求之间复用；相同输入与参数的预测结果直接从缓存返回。
+# 每个序列一次生成 14 天（滑块上限），切换预测天数时直接截取，无需重新推理
+model_manager = ModelManager(cache=ForecastCache(max_entries=256), max_horizon=14)
+# 并发请求在短时间窗口内合并为一次批量推理
+scheduler = MicroBatchScheduler(model_manager, max_batch_size=16, max_wait_ms=20)
 
 # 生成默认合成数据（避免依赖外部文件）
 def generate_default_skin_data():
@@ -43,11 +51,8 @@ def forecast_skin_price(file, pred_days):
         # 确保 timestamps 是 datetime
         df['timestamps'] = pd.to_datetime(df['timestamps'])
 
-        # 初始化预测器（自动选设备）
-        predictor = CS2SkinPredictor()
-
-        # 预测
-        pred_df = predictor.predict(df, pred_days=pred_days)
+        # 交给调度器，与同时到达的其他请求合并推理
+        pred_df = scheduler.predict(df, pred_days=int(pred_days))
 
         # 绘图
         hist_len = min(3 * pred_days, len(df))
@@ -104,7 +109,8 @@ with gr.Blocks(title="Kronos CS2 Skin Forecast") as demo:
     run_btn.click(
         fn=forecast_skin_price,
         inputs=[file_input, pred_days],
-        outputs=[output_image, output_table]
+        outputs=[output_image, output_table],
+        concurrency_limit=16
     )
 
     gr.Markdown("### 📌 注意")
@@ -115,4 +121,6 @@ with gr.Blocks(title="Kronos CS2 Skin Forecast") as demo:
     """)
 
 if __name__ == "__main__":
+    # 启动时加载并预热模型，首个请求无需等待模型加载
+    model_manager.warmup()
     demo.launch()
\ No newline at end of file
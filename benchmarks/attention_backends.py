@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+import torch
+
+# 添加项目根目录以导入 model
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.module import ATTENTION_BACKENDS, KVCache, MultiHeadAttentionWithRoPE, set_attention_backend
+
+# === 配置（与 Kronos-small 的单个注意力层一致：d_model=512，8 个头）===
+D_MODEL = 512
+N_HEADS = 8
+BATCH_SIZE = 16
+CONTEXT_LENGTHS = (64, 128, 256, 512)
+REPEAT = 10
+
+
+def timeit(fn):
+    """返回 fn 单次调用的平均耗时（毫秒）"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def padding_mask(seq_len):
+    """左侧填充：每条序列的有效长度在 seq_len/2 到 seq_len 之间，True 表示填充位置"""
+    lengths = torch.linspace(seq_len // 2, seq_len, BATCH_SIZE).long()
+    return torch.arange(seq_len)[None, :] < (seq_len - lengths)[:, None]
+
+
+def decode_step(layer, x, mask):
+    """预填充 seq_len - 1 个位置后，计时单步增量解码"""
+    cache = KVCache()
+    layer(x[:, :-1], key_padding_mask=None if mask is None else mask[:, :-1], kv_cache=cache)
+    k, v = cache.k, cache.v
+
+    def step():
+        cache.k, cache.v, cache.start_pos = k, v, 0
+        return layer(x[:, -1:], key_padding_mask=mask, kv_cache=cache)
+    return step
+
+
+if __name__ == "__main__":
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    layer = MultiHeadAttentionWithRoPE(D_MODEL, N_HEADS).eval()
+
+    print(f"📊 注意力后端基准: batch={BATCH_SIZE}, d_model={D_MODEL}, n_heads={N_HEADS}（单位 ms，括号内为相对 reference 的最大误差）")
+    print(f"{'场景':<16}{'长度':>6}" + "".join(f"{backend:>24}" for backend in ATTENTION_BACKENDS))
+    with torch.no_grad():
+        for seq_len in CONTEXT_LENGTHS:
+            x = torch.randn(BATCH_SIZE, seq_len, D_MODEL)
+            mask = padding_mask(seq_len)
+            cases = {
+                "预填充": lambda: layer(x),
+                "预填充+左填充": lambda: layer(x, key_padding_mask=mask),
+                "单步解码": decode_step(layer, x, None),
+                "单步解码+左填充": decode_step(layer, x, mask),
+            }
+            for name, fn in cases.items():
+                row, ref = f"{name:<16}{seq_len:>6}", None
+                for backend in ATTENTION_BACKENDS:
+                    set_attention_backend(layer, backend)
+                    out = fn()
+                    ref = out if ref is None else ref
+                    row += f"{timeit(fn):>14.3f} ({(out - ref).abs().max().item():.1e})"
+                print(row)
+                set_attention_backend(layer, "reference")
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+# 添加项目根目录以导入 model
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.kronos import calc_time_stamps
+from model.module import HierarchicalEmbedding, TemporalEmbedding
+
+# === 配置（与 Kronos-small 一致：d_model=512，s1/s2 各 10 bit）===
+D_MODEL = 512
+S_BITS = 10
+BATCH_SIZE = 16
+SEQ_LEN = 400
+REPEAT = 20
+
+
+def timeit(fn):
+    """返回 fn 单次调用的平均耗时（毫秒）"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def compare(name, module, inputs):
+    """对比折叠前后的输出与耗时（等价性由 tests/test_embedding_fold.py 检查）"""
+    with torch.no_grad():
+        module.eval()
+        module.train()  # 丢弃已有的折叠表
+        module.eval()
+        ref = module(inputs)
+        full_ms = timeit(lambda: module(inputs))
+
+        module.fold()
+        out = module(inputs)
+        fold_ms = timeit(lambda: module(inputs))
+
+    max_diff = (out - ref).abs().max().item()
+    print(f"{name:<24} 最大误差 {max_diff:.2e} | 原始 {full_ms:7.3f} ms | 折叠 {fold_ms:7.3f} ms | 加速 {full_ms / fold_ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    token_emb = HierarchicalEmbedding(S_BITS, S_BITS, D_MODEL)
+    s1_ids = torch.randint(0, 2 ** S_BITS, (BATCH_SIZE, SEQ_LEN))
+    s2_ids = torch.randint(0, 2 ** S_BITS, (BATCH_SIZE, SEQ_LEN))
+
+    # 日线时间戳（分钟、小时恒为 0），以及随机的分钟级时间戳
+    days = pd.Series(pd.date_range("2020-01-01", periods=BATCH_SIZE * SEQ_LEN, freq="D"))
+    minutes = pd.Series(pd.date_range("2020-01-01", periods=BATCH_SIZE * SEQ_LEN, freq="37min"))
+    daily_stamp = torch.from_numpy(calc_time_stamps(days).values.astype(np.float32)).reshape(BATCH_SIZE, SEQ_LEN, 5)
+    minute_stamp = torch.from_numpy(calc_time_stamps(minutes).values.astype(np.float32)).reshape(BATCH_SIZE, SEQ_LEN, 5)
+
+    print(f"📊 嵌入折叠基准: batch={BATCH_SIZE}, seq_len={SEQ_LEN}, d_model={D_MODEL}")
+    for step, length in (("预填充", SEQ_LEN), ("单步解码", 1)):
+        compare(f"HierarchicalEmbedding {step}", token_emb, [s1_ids[:, :length], s2_ids[:, :length]])
+    for learn_pe in (False, True):
+        time_emb = TemporalEmbedding(D_MODEL, learn_pe)
+        kind = "learned" if learn_pe else "fixed"
+        compare(f"TemporalEmbedding {kind} 日线", time_emb, daily_stamp)
+        compare(f"TemporalEmbedding {kind} 分钟", time_emb, minute_stamp)
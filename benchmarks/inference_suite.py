@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+# 添加项目根目录以导入 model
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from model import Kronos, KronosTokenizer, KronosPredictor
+from model.profiler import Profiler
+
+# === 模型配置（与 Hugging Face 上 Kronos-small / Kronos-base 及 Kronos-Tokenizer-base 的结构一致，权重随机初始化，无需联网）===
+TOKENIZER_BASE = dict(d_in=6, d_model=256, n_heads=4, ff_dim=512, n_enc_layers=4, n_dec_layers=4, ffn_dropout_p=0.0,
+                      attn_dropout_p=0.0, resid_dropout_p=0.0, s1_bits=10, s2_bits=10, beta=0.05, gamma0=1.0, gamma=1.1,
+                      zeta=0.05, group_size=4)
+CONFIGS = {
+    "small": (dict(s1_bits=10, s2_bits=10, n_layers=8, d_model=512, n_heads=8, ff_dim=1024, ffn_dropout_p=0.0, attn_dropout_p=0.0,
+                   resid_dropout_p=0.0, token_dropout_p=0.0, learn_te=True), TOKENIZER_BASE),
+    "base": (dict(s1_bits=10, s2_bits=10, n_layers=12, d_model=832, n_heads=16, ff_dim=2048, ffn_dropout_p=0.0, attn_dropout_p=0.0,
+                  resid_dropout_p=0.0, token_dropout_p=0.0, learn_te=True), TOKENIZER_BASE),
+}
+MAX_CONTEXT = 512
+
+# === 场景：以 DEFAULT 为中心，每次只改变一个维度 ===
+DEFAULT = dict(batch_size=8, context=256, pred_len=7, sample_count=1)
+SWEEPS = {
+    "context": [64, 128, 256, 512],
+    "pred_len": [1, 7, 30],
+    "sample_count": [1, 4],
+    "batch_size": [1, 8, 32],
+}
+QUICK_SWEEPS = {"context": [64, 256], "batch_size": [1, 8]}
+REPEAT = 5
+
+# 与基准对比的指标，以及数值越大越好的指标
+METRICS = ("total_ms", "encode_ms", "prefill_ms", "decode_step_ms", "tokenizer_decode_ms", "tokens_per_s", "peak_rss_mb")
+HIGHER_IS_BETTER = {"tokens_per_s"}
+# 共享 CPU 上同一提交两次运行的差异可达 10% 左右
+REGRESSION_THRESHOLD = 0.15
+
+# 结果与基准随机器、线程数和 torch 版本变化，不纳入版本管理（见 .gitignore）。
+# 在改动前的提交上运行一次 --save-baseline 生成本机基准，之后每次运行自动与之对比
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "results", "baseline.json")
+
+
+def build_predictor(config, dtype="float32", seed=0):
+    """按配置构建随机权重的模型与 Tokenizer，走与线上相同的推理优化路径"""
+    model_cfg, tokenizer_cfg = CONFIGS[config]
+    torch.manual_seed(seed)
+    tokenizer = KronosTokenizer(**tokenizer_cfg).eval()
+    model = Kronos(**model_cfg).eval()
+    tokenizer.optimize_for_inference()
+    model.optimize_for_inference()
+    return KronosPredictor(model, tokenizer, device="cpu", max_context=MAX_CONTEXT, dtype=dtype)
+
+
+def scenarios(sweeps):
+    """展开各维度的扫描，去掉重复的场景"""
+    seen = {}
+    for dim, values in sweeps.items():
+        for value in values:
+            params = dict(DEFAULT, **{dim: value})
+            seen.setdefault(tuple(sorted(params.items())), params)
+    return list(seen.values())
+
+
+def make_inputs(batch_size, context, pred_len, seed=0):
+    """随机游走价格序列与日线时间特征（minute, hour, weekday, day, month）"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (batch_size, context)), axis=1))
+    x = np.stack([close, close * 1.01, close * 0.99, close, rng.uniform(100, 1000, close.shape), np.zeros_like(close)], axis=-1)
+
+    def stamps(start, length):
+        days = np.arange(start, start + length)
+        return np.stack([np.zeros(length), np.zeros(length), days % 7, days % 28 + 1, days // 28 % 12 + 1], axis=-1).astype(np.float32)
+    return list(x.astype(np.float32)), [stamps(0, context)] * batch_size, [stamps(context, pred_len)] * batch_size
+
+
+def scenario_key(config, params):
+    return f"{config}/b{params['batch_size']}/ctx{params['context']}/p{params['pred_len']}/s{params['sample_count']}"
+
+
+def measure(predictor, params):
+    """预热一次后运行 REPEAT 次，各阶段耗时取 Profiler 统计，每个指标取中位数"""
+    x, x_stamp, y_stamp = make_inputs(params["batch_size"], params["context"], params["pred_len"])
+
+    def run():
+        return predictor.predict_arrays(x, x_stamp, y_stamp, params["pred_len"], sample_count=params["sample_count"], seed=0)
+
+    run()
+    rows = []
+    for _ in range(REPEAT):
+        with Profiler(track_memory=True) as prof:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+        stages = prof.summary()
+
+        def total(name):
+            return stages[name]["total_ms"] if name in stages else 0.0
+        generated = params["batch_size"] * params["sample_count"] * params["pred_len"]
+        rows.append({
+            "total_ms": seconds * 1000,
+            "encode_ms": total("tokenizer.encode"),
+            "prefill_ms": total("prefill"),
+            # 每个预测步：decode_s1（第一步复用预填充）+ decode_s2 + 两次采样
+            "decode_step_ms": (total("decode_s1") + total("decode_s2") + total("sample")) / params["pred_len"],
+            "tokenizer_decode_ms": total("tokenizer.decode"),
+            "tokens_per_s": generated / seconds,
+            "peak_rss_mb": stages["generate"]["peak_rss_mb"],
+        })
+    return {metric: float(np.median([row[metric] for row in rows])) if rows[0][metric] is not None else None for metric in METRICS}
+
+
+def batch_drift(predictor, params):
+    """
+    场景整批预测与逐个序列单独预测的收盘价相对偏差（%）。
+
+    float32 下同一种子采样的 token 与批次组成无关，padding 只带来浮点舍入级别的偏差（约 1e-4 %）；bfloat16 / float16 下矩阵乘法的分块与累加顺序随批次大小变化，
+    舍入误差经自回归采样逐步放大，同一序列在不同批次中的预测会相差几个百分点。
+    """
+    x, x_stamp, y_stamp = make_inputs(params["batch_size"], params["context"], params["pred_len"])
+    kwargs = dict(sample_count=params["sample_count"], seed=0)
+    batch = predictor.predict_arrays(x, x_stamp, y_stamp, params["pred_len"], **kwargs)
+    deviation = []
+    for i in range(len(x)):
+        alone = predictor.predict_arrays(x[i:i + 1], x_stamp[i:i + 1], y_stamp[i:i + 1], params["pred_len"], **kwargs)[0]
+        deviation.append(np.abs(batch[i][:, 3] / alone[:, 3] - 1) * 100)
+    deviation = np.concatenate(deviation)
+    return {"mean": float(deviation.mean()), "max": float(deviation.max())}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(configs, sweeps, dtype="float32"):
+    """
+    运行基准套件。
+
+    Returns:
+        dict: meta（环境信息）与 results（每个场景一行，含场景参数和各项指标）
+    """
+    results = []
+    drift = {}
+    for config in configs:
+        print(f"🚀 构建 {config} 配置（随机权重，dtype={dtype}）...")
+        predictor = build_predictor(config, dtype)
+        for params in scenarios(sweeps):
+            key = scenario_key(config, params)
+            metrics = measure(predictor, params)
+            results.append(dict(key=key, config=config, **params, **metrics))
+            print(f"   {key:<28} 总耗时 {metrics['total_ms']:9.1f} ms | 预填充 {metrics['prefill_ms']:8.1f} ms | "
+                  f"单步解码 {metrics['decode_step_ms']:7.2f} ms | {metrics['tokens_per_s']:8.1f} tokens/s")
+        if dtype != "float32":
+            drift[config] = batch_drift(predictor, DEFAULT)
+            print(f"⚠️ {dtype} 下预测随批次组成变化：{scenario_key(config, DEFAULT)} 整批与单独预测的收盘价偏差 "
+                  f"平均 {drift[config]['mean']:.2f}%，最大 {drift[config]['max']:.2f}%。需要可复现的结果时使用 float32")
+        del predictor
+    meta = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "threads": torch.get_num_threads(),
+        "dtype": dtype,
+        "repeat": REPEAT,
+        # 整批与单独预测的收盘价偏差（%），仅低精度时测量
+        "batch_drift_pct": drift or None,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    与基准结果逐场景对比，打印各指标的相对变化。
+
+    Returns:
+        list: 变差超过 threshold 的 (场景, 指标, 相对变化)
+    """
+    for field in ("torch", "threads", "dtype", "machine"):
+        if report["meta"].get(field) != baseline["meta"].get(field):
+            print(f"⚠️ 与基准的环境不同: {field} {baseline['meta'].get(field)} -> {report['meta'].get(field)}")
+    base_rows = {row["key"]: row for row in baseline["results"]}
+    regressions = []
+    print(f"\n📊 对比基准（commit {baseline['meta'].get('commit')}），正值表示变好:")
+    print(f"{'场景':<28}" + "".join(f"{metric:>21}" for metric in METRICS))
+    for row in report["results"]:
+        base = base_rows.get(row["key"])
+        if base is None:
+            continue
+        line = f"{row['key']:<28}"
+        for metric in METRICS:
+            if row[metric] is None or not base.get(metric):
+                line += f"{'-':>21}"
+                continue
+            change = row[metric] / base[metric] - 1
+            improvement = change if metric in HIGHER_IS_BETTER else -change
+            flag = " ⚠️" if improvement < -threshold else ""
+            if flag:
+                regressions.append((row["key"], metric, improvement))
+            line += f"{improvement:>+18.1%}{flag or '   '}"
+        print(line)
+    missing = set(base_rows) - {row["key"] for row in report["results"]}
+    if missing:
+        print(f"基准中有 {len(missing)} 个场景本次未运行")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kronos 推理离线基准套件（随机权重，无需联网）")
+    parser.add_argument("--configs", nargs="+", default=["small"], choices=sorted(CONFIGS))
+    parser.add_argument("--quick", action="store_true", help="只跑少量场景，用于 CI 冒烟测试")
+    parser.add_argument("--dtype", default="float32", help="推理精度，见 KronosPredictor")
+    parser.add_argument("--threads", type=int, default=None, help="torch 线程数，默认不修改")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基准 JSON 路径，存在时自动对比")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果另存为基准")
+    parser.add_argument("--fail-on-regression", action="store_true", help=f"有指标变差超过 {REGRESSION_THRESHOLD:.0%}% 时以非零状态退出")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    report = run_suite(args.configs, QUICK_SWEEPS if args.quick else SWEEPS, args.dtype)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 结果已保存到 {args.output}")
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print(f"⚠️ {len(regressions)} 项指标变差超过 {REGRESSION_THRESHOLD:.0%}")
+    elif not args.save_baseline:
+        print(f"ℹ️ 未找到基准 {args.baseline}，跳过对比。可在改动前的提交上加 --save-baseline 运行一次生成本机基准")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 已保存为基准: {args.baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+# 添加项目根目录以导入 src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.predictor import CS2SkinPredictor, HISTORY_LEN
+
+# === 配置 ===
+DATA_PATH = "examples/data/synthetic_500_skins_ohlc.csv"
+NUM_SKINS = 50
+PRED_DAYS = 7
+SEED = 0
+DRIFT_SKINS = 10
+
+
+def split_panel(df, num_skins, pred_days):
+    """取前 num_skins 个皮肤，每个皮肤最后 pred_days 天作为真实值，之前最多 HISTORY_LEN 天作为历史"""
+    skin_ids = df["skin_id"].unique()[:num_skins]
+    df = df[df["skin_id"].isin(skin_ids)].sort_values(["skin_id", "timestamps"])
+    groups = df.groupby("skin_id", sort=False)
+    actual = groups.tail(pred_days)
+    history = df.drop(actual.index)
+    history = history.groupby("skin_id", sort=False).tail(HISTORY_LEN)
+    return history, actual
+
+
+def model_bytes(predictor):
+    """模型与 Tokenizer 序列化后的权重大小（字节），量化后的打包权重也计入"""
+    size = 0
+    for module in (predictor.model, predictor.tokenizer):
+        buffer = io.BytesIO()
+        torch.save(module.state_dict(), buffer)
+        size += buffer.getbuffer().nbytes
+    return size
+
+
+def run(predictor, history, pred_days, seed):
+    """预热一次后计时批量预测，返回 (预测结果, 耗时秒数)"""
+    first_skin = history["skin_id"].iloc[0]
+    predictor.predict_batch(history[history["skin_id"] == first_skin], pred_days=pred_days, seed=seed)
+    start = time.perf_counter()
+    preds = predictor.predict_batch(history, pred_days=pred_days, seed=seed)
+    return preds, time.perf_counter() - start
+
+
+def mape(preds, actual):
+    """收盘价的平均绝对百分比误差（%），按皮肤和预测日对齐"""
+    merged = preds[["skin_id", "timestamps", "close"]].merge(
+        actual[["skin_id", "timestamps", "close"]], on=["skin_id", "timestamps"], suffixes=("_pred", "_true")
+    )
+    return float(np.mean(np.abs(merged["close_pred"] / merged["close_true"] - 1)) * 100)
+
+
+def batch_drift(predictor, history, pred_days, seed, num_skins=DRIFT_SKINS):
+    """
+    前 num_skins 个皮肤整批预测与逐个单独预测的收盘价相对偏差（%）。
+
+    设置种子后每个皮肤采样的 token 应与批次组成无关，padding 只带来浮点舍入级别的偏差；偏差明显大于舍入误差说明同批的其他皮肤影响了结果，
+    分片、分块和缓存命中都会改变预测。
+    """
+    skin_ids = history["skin_id"].unique()[:num_skins]
+    history = history[history["skin_id"].isin(skin_ids)]
+    batch = predictor.predict_batch(history, pred_days=pred_days, seed=seed)
+    alone = pd.concat([predictor.predict_batch(history[history["skin_id"] == skin_id], pred_days=pred_days, seed=seed)
+                       for skin_id in skin_ids])
+    merged = batch.merge(alone, on=["skin_id", "timestamps"], suffixes=("_batch", "_alone"))
+    deviation = np.abs(merged["close_batch"] / merged["close_alone"] - 1) * 100
+    return {"mean": float(deviation.mean()), "max": float(deviation.max())}
+
+
+def compare(baseline, candidate, history, actual, pred_days=PRED_DAYS, seed=SEED):
+    """
+    在同一批皮肤、同一采样种子下对比两个预测器。
+
+    相同种子下两者的采样随机数完全一致，因此预测差异只来自数值精度（量化误差）。
+
+    Returns:
+        dict: 各预测器的收盘价 MAPE、耗时、权重大小和批次组成带来的偏差，以及候选相对基准的预测偏差
+    """
+    report = {"num_skins": int(history["skin_id"].nunique()), "pred_days": pred_days}
+    preds = {}
+    for name, predictor in (("baseline", baseline), ("candidate", candidate)):
+        preds[name], seconds = run(predictor, history, pred_days, seed)
+        report[name] = {
+            "mape_pct": mape(preds[name], actual),
+            "seconds": seconds,
+            "weights_mb": model_bytes(predictor) / 1024 / 1024,
+            "batch_drift_pct": batch_drift(predictor, history, pred_days, seed),
+        }
+    deviation = np.abs(preds["candidate"]["close"].values / preds["baseline"]["close"].values - 1) * 100
+    report["close_deviation_pct"] = {"mean": float(deviation.mean()), "max": float(deviation.max())}
+    report["speedup"] = report["baseline"]["seconds"] / report["candidate"]["seconds"]
+    report["weight_ratio"] = report["candidate"]["weights_mb"] / report["baseline"]["weights_mb"]
+    return report
+
+
+def print_report(report, names=("fp32", "int8")):
+    print(f"\n📊 量化对比: {report['num_skins']} 个皮肤，预测 {report['pred_days']} 天")
+    print(f"{'':<8}{'收盘价 MAPE':>14}{'耗时 (s)':>12}{'权重 (MB)':>12}")
+    for key, name in zip(("baseline", "candidate"), names):
+        row = report[key]
+        print(f"{name:<8}{row['mape_pct']:>13.2f}%{row['seconds']:>12.2f}{row['weights_mb']:>12.1f}")
+    deviation = report["close_deviation_pct"]
+    print(f"{names[1]} 相对 {names[0]} 的收盘价偏差: 平均 {deviation['mean']:.3f}%，最大 {deviation['max']:.3f}%")
+    for key, name in zip(("baseline", "candidate"), names):
+        drift = report[key]["batch_drift_pct"]
+        print(f"{name} 整批与单独预测的收盘价偏差: 平均 {drift['mean']:.4f}%，最大 {drift['max']:.4f}%")
+    print(f"加速 {report['speedup']:.2f}x，权重大小 {report['weight_ratio']:.0%}")
+
+
+if __name__ == "__main__":
+    if not os.path.exists(DATA_PATH):
+        raise FileNotFoundError("请先运行:\n  python examples/generate_500_skins.py")
+    df = pd.read_csv(DATA_PATH)
+    df["timestamps"] = pd.to_datetime(df["timestamps"])
+    history, actual = split_panel(df, NUM_SKINS, PRED_DAYS)
+
+    print("🚀 加载 fp32 与 int8 预测器（CPU）...")
+    fp32 = CS2SkinPredictor(device="cpu")
+    int8 = CS2SkinPredictor(device="cpu", quantize="int8")
+    print_report(compare(fp32, int8, history, actual))
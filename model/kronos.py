@@ -1,3 +1,5 @@
+import hashlib
+import warnings
 import numpy as np
 import pandas as pd
 import torch
@@ -8,6 +10,7 @@ from tqdm import trange
 
 sys.path.append("../")
 from model.module import *
+from model.profiler import stage
 
 
 class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
@@ -134,45 +137,68 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
             mask = 2 ** torch.arange(self.codebook_dim, device=x.device, dtype=torch.long) # Create a mask for bit extraction
             x = (x.unsqueeze(-1) & mask) != 0 # Extract bits
 
-        x = x.float() * 2 - 1 # Convert boolean to bipolar (-1, 1)
+        x = x.to(self.embed.weight.dtype) * 2 - 1 # Convert boolean to bipolar (-1, 1), in the tokenizer's dtype
         q_scale = 1. / (self.codebook_dim ** 0.5) # Scaling factor
         x = x * q_scale
         return x
 
-    def encode(self, x, half=False):
+    def optimize_for_inference(self):
+        """
+        Applies inference-only graph optimizations in place: fuses the q/k/v and feed-forward w1/w3
+        projections of every encoder and decoder block into single GEMMs and folds the RMSNorm weights into them.
+        Outputs only change by float rounding. The parameters no longer follow the checkpoint layout,
+        so an optimized tokenizer should not be saved or trained.
+
+        Returns:
+            KronosTokenizer: self, in eval mode.
+        """
+        for block in list(self.encoder) + list(self.decoder):
+            block.optimize_for_inference()
+        return self.eval()
+
+    def encode(self, x, half=False, padding_mask=None, kv_cache=None):
         """
         Encodes the input data into quantized indices.
 
         Args:
             x (torch.Tensor): Input tensor of shape (batch_size, seq_len, d_in).
             half (bool, optional): Whether to use half quantization in BSQuantizer. Defaults to False.
+            padding_mask (torch.Tensor, optional): Mask for padding positions (True = padding). Shape: (batch_size, seq_len). Defaults to None.
+            kv_cache (List[KVCache], optional): One cache per encoder layer, updated in place. The encoder is causal,
+                so with a cache only the new positions need to be passed in. Defaults to None.
 
         Returns:
             torch.Tensor: Quantized indices from BSQuantizer.
         """
         z = self.embed(x)
-        for layer in self.encoder:
-            z = layer(z)
+        if kv_cache is None:
+            kv_cache = [None] * len(self.encoder)
+        for layer, layer_cache in zip(self.encoder, kv_cache):
+            z = layer(z, key_padding_mask=padding_mask, kv_cache=layer_cache)
         z = self.quant_embed(z)
 
-        bsq_loss, quantized, z_indices = self.tokenizer(z, half)
-        return z_indices
+        # Only the indices are returned, so the quantizer's loss bookkeeping is skipped
+        return self.tokenizer.indices(z, half)
 
-    def decode(self, x, half=False):
+    def decode(self, x, half=False, padding_mask=None, kv_cache=None):
         """
         Decodes quantized indices back to the input data space.
 
         Args:
             x (torch.Tensor): Quantized indices tensor.
             half (bool, optional): Whether the indices were generated with half quantization. Defaults to False.
+            padding_mask (torch.Tensor, optional): Mask for padding positions (True = padding). Shape: (batch_size, seq_len). Defaults to None.
+            kv_cache (List[KVCache], optional): One cache per decoder layer, updated in place, see `encode`. Defaults to None.
 
         Returns:
             torch.Tensor: Reconstructed output tensor of shape (batch_size, seq_len, d_in).
         """
         quantized = self.indices_to_bits(x, half)
         z = self.post_quant_embed(quantized)
-        for layer in self.decoder:
-            z = layer(z)
+        if kv_cache is None:
+            kv_cache = [None] * len(self.decoder)
+        for layer, layer_cache in zip(self.decoder, kv_cache):
+            z = layer(z, key_padding_mask=padding_mask, kv_cache=layer_cache)
         z = self.head(z)
         return z
 
@@ -236,6 +262,40 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
         elif isinstance(module, RMSNorm):
             nn.init.ones_(module.weight)
 
+    def fold_embeddings(self):
+        """
+        Precomputes the token and temporal embedding lookup tables used in eval mode.
+        See `HierarchicalEmbedding.fold` and `TemporalEmbedding.fold`.
+        """
+        self.embedding.fold()
+        self.time_emb.fold()
+        return self
+
+    @torch.no_grad()
+    def optimize_for_inference(self):
+        """
+        Applies inference-only graph optimizations in place:
+            - fuses the q/k/v projections of every block and the k/v projections of the dependency layer,
+            - fuses the feed-forward w1/w3 projections,
+            - folds RMSNorm weights into the projections consuming their output (the final norm also feeds a
+              residual and is kept),
+            - builds the folded embedding tables (`fold_embeddings`).
+        Outputs only change by float rounding. The parameters no longer follow the checkpoint layout,
+        so an optimized model should not be saved or trained.
+
+        Returns:
+            Kronos: self, in eval mode.
+        """
+        for block in self.transformer:
+            block.optimize_for_inference()
+        cross_attn = self.dep_layer.cross_attn
+        if cross_attn.kv_proj is None:
+            cross_attn.fuse_projections()
+        if self.dep_layer.norm.weight is not None:
+            # The dependency layer output is only consumed by the s2 head
+            self.head.proj_s2.weight.mul_(self.dep_layer.norm.pop_weight())
+        return self.eval().fold_embeddings()
+
     def forward(self, s1_ids, s2_ids, stamp=None, padding_mask=None, use_teacher_forcing=False, s1_targets=None):
         """
         Args:
@@ -275,22 +335,38 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
         s2_logits = self.head.cond_forward(x2)
         return s1_logits, s2_logits
 
-    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None):
+    def init_kv_cache(self):
+        """
+        Creates an empty per-layer key/value cache for incremental decoding with `decode_s1`.
+
+        Returns:
+            List[KVCache]: One cache per Transformer block.
+        """
+        return [KVCache() for _ in self.transformer]
+
+    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None, kv_cache=None, last_only=False):
         """
         Decodes only the s1 tokens.
 
         This method performs a forward pass to predict only s1 tokens. It returns the s1 logits
         and the context representation from the Transformer, which can be used for subsequent s2 decoding.
 
+        With `kv_cache`, only the new positions are passed in: the first call (prefill) fills the
+        cache with the whole history and subsequent calls append one or more positions to it.
+
         Args:
             s1_ids (torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
             s2_ids (torch.Tensor): Input tensor of s2 token IDs. Shape: [batch_size, seq_len]
             stamp (torch.Tensor, optional): Temporal stamp tensor. Shape: [batch_size, seq_len]. Defaults to None.
-            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len], or
+                [batch_size, cached_len + seq_len] when `kv_cache` is given. Defaults to None.
+            kv_cache (List[KVCache], optional): Per-layer cache from `init_kv_cache`, updated in place. Defaults to None.
+            last_only (bool, optional): Whether to compute s1 logits for the last position only. Defaults to False.
 
         Returns:
             Tuple[torch.Tensor, torch.Tensor]:
-                - s1 logits: Logits for s1 token predictions. Shape: [batch_size, seq_len, s1_vocab_size]
+                - s1 logits: Logits for s1 token predictions. Shape: [batch_size, seq_len, s1_vocab_size],
+                  or [batch_size, 1, s1_vocab_size] with `last_only`
                 - context: Context representation from the Transformer. Shape: [batch_size, seq_len, d_model]
         """
         x = self.embedding([s1_ids, s2_ids])
@@ -299,64 +375,114 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
             x = x + time_embedding
         x = self.token_drop(x)
 
-        for layer in self.transformer:
-            x = layer(x, key_padding_mask=padding_mask)
+        if kv_cache is None:
+            kv_cache = [None] * len(self.transformer)
+        for layer, layer_cache in zip(self.transformer, kv_cache):
+            x = layer(x, key_padding_mask=padding_mask, kv_cache=layer_cache)
 
         x = self.norm(x)
 
-        s1_logits = self.head(x)
+        s1_logits = self.head(x[:, -1:] if last_only else x)
         return s1_logits, x
 
-    def decode_s2(self, context, s1_ids, padding_mask=None):
+    def cache_context(self, context, kv_cache):
+        """
+        Appends context positions to a cross-attention cache without decoding s2.
+
+        Args:
+            context (torch.Tensor): Context representation from `decode_s1`. Shape: [batch_size, seq_len, d_model]
+            kv_cache (KVCache): Cross-attention cache, as passed to `decode_s2`.
+        """
+        self.dep_layer.cross_attn.cache_kv(context, context, kv_cache)
+
+    def decode_s2(self, context, s1_ids, padding_mask=None, kv_cache=None):
         """
         Decodes the s2 tokens, conditioned on the context and s1 tokens.
 
         This method decodes s2 tokens based on a pre-computed context representation (typically from `decode_s1`)
         and the s1 token IDs. It uses the dependency-aware layer and the conditional s2 head to predict s2 tokens.
 
+        With `kv_cache`, the cross-attention keys/values of earlier context positions are reused:
+        `context` only holds the positions not seen yet, `s1_ids` is the sampled s1 token of the
+        last position, and the dependency-aware layer and head run for that position only.
+
         Args:
             context (torch.Tensor): Context representation from the transformer (output of decode_s1).
                                      Shape: [batch_size, seq_len, d_model]
-            s1_ids (torch.torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
-            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            s1_ids (torch.torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len], or [batch_size, 1]
+                                     with `kv_cache`.
+            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len], or
+                [batch_size, cached_len + seq_len] when `kv_cache` is given. Defaults to None.
+            kv_cache (KVCache, optional): Cache of the cross-attention projections, updated in place. Defaults to None.
 
         Returns:
-            torch.Tensor: s2 logits. Shape: [batch_size, seq_len, s2_vocab_size]
+            torch.Tensor: s2 logits. Shape: [batch_size, seq_len, s2_vocab_size], or [batch_size, 1, s2_vocab_size]
+                          with `kv_cache`.
         """
         sibling_embed = self.embedding.emb_s1(s1_ids)
-        x2 = self.dep_layer(context, sibling_embed, key_padding_mask=padding_mask)
+        x2 = self.dep_layer(context, sibling_embed, key_padding_mask=padding_mask, kv_cache=kv_cache)
         return self.head.cond_forward(x2)
 
 
+# Number of candidates the nucleus cut starts from; doubled until it covers `top_p` of the mass.
+NUCLEUS_CANDIDATES = 64
+
+
 def top_k_top_p_filtering(
         logits,
-        top_k: int = 0,
-        top_p: float = 1.0,
+        top_k=0,
+        top_p=1.0,
         filter_value: float = -float("Inf"),
         min_tokens_to_keep: int = 1,
 ):
     """Filter a distribution of logits using top-k and/or nucleus (top-p) filtering
     Args:
         logits: logits distribution shape (batch size, vocabulary size)
+        top_k, top_p: scalars, or tensors of shape (batch size,) with one setting per row.
         if top_k > 0: keep only top k tokens with highest probability (top-k filtering).
         if top_p < 1.0: keep the top tokens with cumulative probability >= top_p (nucleus filtering).
             Nucleus filtering is described in Holtzman et al. (http://arxiv.org/abs/1904.09751)
+        Rows with top_k > 0 use top-k filtering only.
         Make sure we keep at least min_tokens_to_keep per batch example in the output
     From: https://gist.github.com/thomwolf/1a5a29f6962089e871b94cbd09daf317
+
+    Instead of sorting the whole vocabulary, the nucleus is searched among the top
+    `NUCLEUS_CANDIDATES` tokens, doubling the candidates until they hold more than `top_p`
+    of the probability mass in every nucleus row.
     """
-    if top_k > 0:
-        top_k = min(max(top_k, min_tokens_to_keep), logits.size(-1))  # Safety check
-        # Remove all tokens with a probability less than the last token of the top-k
-        indices_to_remove = logits < torch.topk(logits, top_k)[0][..., -1, None]
-        logits[indices_to_remove] = filter_value
+    batch_size, vocab_size = logits.shape
+    top_k = torch.as_tensor(top_k, device=logits.device).expand(batch_size)
+    top_p = torch.as_tensor(top_p, dtype=logits.dtype, device=logits.device).expand(batch_size)
+    use_k = top_k > 0
+    use_p = ~use_k & (top_p < 1.0)
+    if not use_k.any() and not use_p.any():
         return logits
 
-    if top_p < 1.0:
-        sorted_logits, sorted_indices = torch.sort(logits, descending=True)
-        cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
+    top_k = top_k.clamp(min=min_tokens_to_keep, max=vocab_size)  # Safety check
+    n_candidates = int(top_k[use_k].max()) if use_k.any() else 1
+    if use_p.any():
+        probs = F.softmax(logits, dim=-1)
+        n_candidates = max(n_candidates, min(NUCLEUS_CANDIDATES, vocab_size))
+    while True:
+        top_logits, top_indices = torch.topk(logits, n_candidates, dim=-1)
+        if not use_p.any():
+            break
+        top_probs = probs.gather(-1, top_indices)
+        if n_candidates == vocab_size or (top_probs.sum(-1) > top_p)[use_p].all():
+            break
+        n_candidates = min(2 * n_candidates, vocab_size)
+
+    indices_to_remove = torch.zeros_like(logits, dtype=torch.bool)
+    if use_k.any():
+        # Remove all tokens with a probability less than the last token of the top-k
+        kth_logits = top_logits.gather(-1, (top_k.clamp(max=n_candidates) - 1)[:, None])
+        indices_to_remove = torch.where(use_k[:, None], logits < kth_logits, indices_to_remove)
+
+    if use_p.any():
+        cumulative_probs = torch.cumsum(top_probs, dim=-1)
 
         # Remove tokens with cumulative probability above the threshold (token with 0 are kept)
-        sorted_indices_to_remove = cumulative_probs > top_p
+        sorted_indices_to_remove = cumulative_probs > top_p[:, None]
         if min_tokens_to_keep > 1:
             # Keep at least min_tokens_to_keep (set to min_tokens_to_keep-1 because we add the first one below)
             sorted_indices_to_remove[..., :min_tokens_to_keep] = 0
@@ -364,29 +490,127 @@ def top_k_top_p_filtering(
         sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
         sorted_indices_to_remove[..., 0] = 0
 
-        # scatter sorted tensors to original indexing
-        indices_to_remove = sorted_indices_to_remove.scatter(1, sorted_indices, sorted_indices_to_remove)
-        logits[indices_to_remove] = filter_value
-        return logits
+        # scatter the candidates back to original indexing; tokens outside the candidates are removed
+        nucleus_to_remove = torch.ones_like(indices_to_remove).scatter(1, top_indices, sorted_indices_to_remove)
+        indices_to_remove = torch.where(use_p[:, None], nucleus_to_remove, indices_to_remove)
+
+    logits[indices_to_remove] = filter_value
+    return logits
 
 
-def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_logits=True):
+def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_logits=True, uniform=None):
+    """
+    Samples one token per row of `logits` (batch size, vocabulary size). `temperature`, `top_k`
+    and `top_p` are scalars or tensors of shape (batch size,) holding one setting per row.
+
+    If `uniform` (shape (batch size,), values in [0, 1)) is given, tokens are drawn by inverting
+    the cumulative distribution at these values instead of using the global RNG.
+    """
+    logits = logits.float()  # Filter and sample in float32, also for bf16/fp16 models
+    if torch.is_tensor(temperature) and temperature.dim() > 0:
+        temperature = temperature.to(logits)[:, None]
     logits = logits / temperature
     if top_k is not None or top_p is not None:
-        if top_k > 0 or top_p < 1.0:
-            logits = top_k_top_p_filtering(logits, top_k=top_k, top_p=top_p)
+        logits = top_k_top_p_filtering(logits, top_k=0 if top_k is None else top_k, top_p=1.0 if top_p is None else top_p)
 
     probs = F.softmax(logits, dim=-1)
 
     if not sample_logits:
-        _, x = top_k(probs, k=1, dim=-1)
+        x = torch.argmax(probs, dim=-1, keepdim=True)
+    elif uniform is not None:
+        cdf = torch.cumsum(probs, dim=-1)
+        total = cdf[:, -1:].contiguous()
+        x = torch.searchsorted(cdf, uniform.to(cdf)[:, None] * total, right=True)
+        # Guard against rounding past the last token with non-zero probability
+        x = torch.minimum(x, torch.searchsorted(cdf, total))
     else:
         x = torch.multinomial(probs, num_samples=1)
 
     return x
 
 
-def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False):
+WINDOW_MODES = ('exact', 'approx')
+
+
+def _expand_sampling_params(T, top_k, top_p, batch_size, sample_count, device):
+    """Turns per-series sampling parameters into per-row tensors. All-scalar parameters are passed through unchanged."""
+    if all(np.ndim(param) == 0 for param in (T, top_k, top_p)):
+        return T, top_k, top_p
+
+    def expand(param, dtype):
+        return torch.as_tensor(np.asarray(param), dtype=dtype, device=device).expand(batch_size).repeat_interleave(sample_count)
+
+    return expand(T, torch.float32), expand(top_k, torch.long), expand(top_p, torch.float32)
+
+
+def derive_seed(*parts):
+    """Derives a 63-bit seed from arbitrary parts (e.g. a base seed, a series id, a sample index)."""
+    digest = hashlib.sha256(":".join(map(str, parts)).encode()).digest()
+    return int.from_bytes(digest[:8], "little") & (2 ** 63 - 1)
+
+
+def _draw_uniforms(seed, batch_size, sample_count, pred_len, device):
+    """
+    Draws the uniforms consumed by sampling, shape (batch_size * sample_count, pred_len, 2) for the
+    s1 and s2 token of each step. Each row has its own CPU generator seeded from
+    (series seed, sample index), so the draws do not depend on batch composition, device or
+    `pred_len` (a shorter horizon gets a prefix of the same stream).
+    """
+    if seed is None:
+        return None
+    seeds = np.broadcast_to(np.asarray(seed, dtype=np.int64), (batch_size,))
+    uniforms = torch.empty(batch_size * sample_count, pred_len, 2)
+    for i, series_seed in enumerate(seeds.tolist()):
+        for j in range(sample_count):
+            generator = torch.Generator().manual_seed(derive_seed(series_seed, j))
+            uniforms[i * sample_count + j] = torch.rand(pred_len, 2, generator=generator)
+    return uniforms.to(device)
+
+
+def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False, use_cache=True, window_mode='exact', padding_mask=None, decode_chunk_size=None, seed=None, step_fns=None):
+    """
+    Autoregressively generates `pred_len` steps and decodes them back to the input space.
+
+    Histories of different lengths are batched by left-padding them and passing
+    `padding_mask` (shape [batch_size, seq_len], True = padding). Padded positions are
+    masked out as keys in the tokenizer and the model, and RoPE only depends on relative
+    offsets, so each series decodes as if it ran alone.
+
+    `decode_chunk_size` bounds how many sample rows go through `tokenizer.decode` at once
+    (default: all `batch_size * sample_count` rows in one call).
+
+    With `use_cache`, the history is run through the transformer once (prefill) and every
+    following step only processes the newly sampled token against the per-layer KV cache.
+    `window_mode` controls what happens once the sequence no longer fits into `max_context`:
+        - 'exact': the cache is rebuilt over the sliding window, but only on steps where the
+          window actually slides. Matches the full-recompute path.
+        - 'approx': the oldest position is evicted from the cache and decoding continues at
+          constant per-step cost. Cached states still carry the influence of evicted tokens,
+          so results differ slightly from a full recompute of the window.
+
+    `T`, `top_k` and `top_p` are either scalars or per-series sequences of length `batch_size`.
+
+    `seed` (an int or one int per series) makes sampling deterministic per series: every sample
+    row draws from its own generator (see `_draw_uniforms`) instead of the global RNG, so a
+    series gets the same tokens whether it runs alone or in any batch, given the same logits.
+    Padding and batch shape still change the logits by float rounding, so forecasts agree up to
+    rounding (about 1e-6 relative in float32), not bit for bit.
+
+    Token buffers and KV caches are preallocated for `seq_len + pred_len` positions and written in
+    place. `step_fns` (see `compile_decode_steps`) replaces `model.decode_s1`/`model.decode_s2` for
+    the incremental steps of the cached path; these then run against static-shape caches whenever
+    the window never slides (`seq_len + pred_len - 1 <= max_context`), so a compiled step is reused
+    across steps. Static steps attend over masked, unfilled cache slots and only differ from the
+    default path by float rounding.
+    """
+    if window_mode not in WINDOW_MODES:
+        raise ValueError(f"window_mode must be one of {WINDOW_MODES}, got {window_mode!r}.")
+    T, top_k, top_p = _expand_sampling_params(T, top_k, top_p, x.size(0), sample_count, x.device)
+    uniforms = _draw_uniforms(seed, x.size(0), sample_count, pred_len, x.device)
+    if use_cache:
+        return _cached_auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len,
+                                                 clip, T, top_k, top_p, sample_count, verbose, window_mode, padding_mask,
+                                                 decode_chunk_size, uniforms, step_fns)
     with torch.no_grad():
         batch_size = x.size(0)
         initial_seq_len = x.size(1)
@@ -396,16 +620,12 @@ def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context
         x = x.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x.size(1), x.size(2)).to(device)
         x_stamp = x_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x_stamp.size(1), x_stamp.size(2)).to(device)
         y_stamp = y_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, y_stamp.size(1), y_stamp.size(2)).to(device)
+        full_mask = _extend_padding_mask(padding_mask, pred_len, sample_count)
 
-        x_token = tokenizer.encode(x, half=True)
-
-        def get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, pred_step):
-
-            if current_seq_len <= max_context - pred_step:
-                return torch.cat([x_stamp, y_stamp[:, :pred_step, :]], dim=1)
-            else:
-                start_idx = max_context - pred_step
-                return torch.cat([x_stamp[:, -start_idx:, :], y_stamp[:, :pred_step, :]], dim=1)
+        with stage("tokenizer.encode", x.size(0) * x.size(1)):
+            x_token = _token_buffers(tokenizer.encode(x, half=True, padding_mask=_mask_window(full_mask, 0, initial_seq_len)), pred_len)
+        full_stamp = torch.cat([x_stamp, y_stamp], dim=1)
+        n_rows = x.size(0)
 
         if verbose:
             ran = trange
@@ -413,34 +633,231 @@ def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context
             ran = range
         for i in ran(pred_len):
             current_seq_len = initial_seq_len + i
+            window_start = max(0, current_seq_len - max_context)
 
-            if current_seq_len <= max_context:
-                input_tokens = x_token
-            else:
-                input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-
-            current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
+            input_tokens = [t[:, window_start:current_seq_len] for t in x_token]
+            current_stamp = full_stamp[:, window_start:current_seq_len, :]
+            current_mask = _mask_window(full_mask, window_start, current_seq_len)
 
-            s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp)
+            with stage("decode_s1", n_rows * (current_seq_len - window_start)):
+                s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp, padding_mask=current_mask)
             s1_logits = s1_logits[:, -1, :]
-            sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+            with stage("sample", n_rows):
+                sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                uniform=None if uniforms is None else uniforms[:, i, 0])
 
-            s2_logits = model.decode_s2(context, sample_pre)
+            with stage("decode_s2", n_rows * (current_seq_len - window_start)):
+                s2_logits = model.decode_s2(context, sample_pre, padding_mask=current_mask)
             s2_logits = s2_logits[:, -1, :]
-            sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+            with stage("sample", n_rows):
+                sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                 uniform=None if uniforms is None else uniforms[:, i, 1])
 
-            x_token[0] = torch.cat([x_token[0], sample_pre], dim=1)
-            x_token[1] = torch.cat([x_token[1], sample_post], dim=1)
+            x_token[0][:, current_seq_len:current_seq_len + 1] = sample_pre
+            x_token[1][:, current_seq_len:current_seq_len + 1] = sample_post
 
-            torch.cuda.empty_cache()
+        return _decode_samples(tokenizer, x_token, full_mask, max_context, batch_size, sample_count, decode_chunk_size)
 
-        input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-        z = tokenizer.decode(input_tokens, half=True)
-        z = z.reshape(batch_size, sample_count, z.size(1), z.size(2))
-        preds = z.cpu().numpy()
-        preds = np.mean(preds, axis=1)
 
-        return preds
+def compile_decode_steps(model, **compile_kwargs):
+    """
+    Compiles the incremental decode steps of `model` with torch.compile, for the `step_fns` argument
+    of `auto_regressive_inference`. Compilation happens lazily on the first calls.
+
+    Args:
+        model (Kronos): The model to decode with.
+        **compile_kwargs: Passed on to torch.compile, e.g. `mode` or `backend`.
+
+    Returns:
+        Tuple[Callable, Callable]: Compiled `decode_s1` and `decode_s2`.
+    """
+    return torch.compile(model.decode_s1, **compile_kwargs), torch.compile(model.decode_s2, **compile_kwargs)
+
+
+QUANTIZE_MODES = (None, "int8")
+
+# Precisions the model and tokenizer can run in, see `KronosPredictor`
+INFERENCE_DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+
+
+def _check_dtype_support(dtype, device):
+    """Raises ValueError if `device` cannot run the matmuls the model needs in `dtype`."""
+    try:
+        x = torch.ones(2, 2, dtype=dtype, device=device)
+        F.linear(x, x)
+    except RuntimeError as e:
+        raise ValueError(f"dtype {dtype} is not supported on device {device!r}: {e}") from e
+
+
+def quantize_linear_int8(module, skip=()):
+    """
+    Applies dynamic int8 quantization to the nn.Linear layers of `module`, in place: weights are stored
+    as int8 with per-output-channel scales and activations are quantized on the fly. CPU only.
+
+    Apply it after `optimize_for_inference`, which needs the float weights. Layers already quantized
+    are left alone, so calling it twice is harmless.
+
+    Activations get one scale per tensor, computed over the whole batch, so a row's output depends on the
+    other rows (padding included). `KronosPredictor.predict_arrays` therefore runs int8 series one at a time.
+
+    Args:
+        module (nn.Module): Kronos or KronosTokenizer.
+        skip (Iterable[str]): Qualified names of Linear layers to keep in float.
+
+    Returns:
+        nn.Module: `module`.
+    """
+    from torch.ao.quantization import per_channel_dynamic_qconfig, quantize_dynamic
+
+    qconfig_spec = {name: per_channel_dynamic_qconfig for name, child in module.named_modules()
+                    if isinstance(child, nn.Linear) and name not in skip}
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao, but still the only built-in dynamic int8 path
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        quantize_dynamic(module, qconfig_spec, inplace=True)
+    return module
+
+
+def _token_buffers(x_token, pred_len):
+    """Preallocates [batch, seq_len + pred_len] s1/s2 token buffers holding `x_token`, to be filled in place while decoding."""
+    buffers = [t.new_zeros(t.size(0), t.size(1) + pred_len) for t in x_token]
+    for buffer, t in zip(buffers, x_token):
+        buffer[:, :t.size(1)] = t
+    return buffers
+
+
+def _extend_padding_mask(padding_mask, pred_len, sample_count=1):
+    """Extends a history padding mask over the generated steps and the sample replicas."""
+    if padding_mask is None:
+        return None
+    padding_mask = padding_mask.bool()
+    padding_mask = torch.cat([padding_mask, padding_mask.new_zeros(padding_mask.size(0), pred_len)], dim=1)
+    return padding_mask.repeat_interleave(sample_count, dim=0)
+
+
+def _mask_window(padding_mask, start, end):
+    return None if padding_mask is None else padding_mask[:, start:end]
+
+
+def _decode_samples(tokenizer, x_token, full_mask, max_context, batch_size, sample_count, decode_chunk_size=None):
+    """Decodes the last `max_context` tokens of every sample row, `decode_chunk_size` rows at a time, and averages the samples."""
+    input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+    input_mask = _mask_window(full_mask, -max_context, None)
+    n_rows = input_tokens[0].size(0)
+    chunk = n_rows if decode_chunk_size is None else max(1, decode_chunk_size)
+
+    preds = []
+    for start in range(0, n_rows, chunk):
+        chunk_mask = None if input_mask is None else input_mask[start:start + chunk]
+        with stage("tokenizer.decode", min(chunk, n_rows - start) * input_tokens[0].size(1)):
+            z = tokenizer.decode([t[start:start + chunk] for t in input_tokens], half=True, padding_mask=chunk_mask)
+        preds.append(z.float().cpu().numpy())
+    preds = np.concatenate(preds, axis=0)
+    preds = preds.reshape(batch_size, sample_count, preds.shape[1], preds.shape[2])
+    return np.mean(preds, axis=1)
+
+
+def _cached_auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip, T, top_k, top_p, sample_count, verbose, window_mode, padding_mask=None, decode_chunk_size=None, uniforms=None, step_fns=None):
+    with torch.no_grad():
+        batch_size = x.size(0)
+        initial_seq_len = x.size(1)
+        x = torch.clip(x, -clip, clip)
+        full_mask = _extend_padding_mask(padding_mask, pred_len)
+
+        # The history is identical across the sample_count replicas: tokenize and prefill it once per series
+        with stage("tokenizer.encode", batch_size * initial_seq_len):
+            x_token = tokenizer.encode(x, half=True, padding_mask=_mask_window(full_mask, 0, initial_seq_len))
+        full_stamp = torch.cat([x_stamp, y_stamp], dim=1)
+
+        window_start = max(0, initial_seq_len - max_context)
+        kv_cache = model.init_kv_cache()
+        cross_cache = KVCache()
+        with stage("prefill", batch_size * (initial_seq_len - window_start)):
+            s1_logits, context = model.decode_s1(x_token[0][:, window_start:], x_token[1][:, window_start:],
+                                                 full_stamp[:, window_start:initial_seq_len, :],
+                                                 padding_mask=_mask_window(full_mask, window_start, initial_seq_len),
+                                                 kv_cache=kv_cache, last_only=True)
+            model.cache_context(context[:, :-1], cross_cache)
+
+        # Fan out to the replicas only for the sampled continuation
+        for layer_cache in kv_cache + [cross_cache]:
+            layer_cache.repeat_interleave(sample_count)
+        s1_logits = s1_logits.repeat_interleave(sample_count, dim=0)
+        context = context[:, -1:].repeat_interleave(sample_count, dim=0)
+        x_token = _token_buffers([t.repeat_interleave(sample_count, dim=0) for t in x_token], pred_len)
+        full_stamp = full_stamp.repeat_interleave(sample_count, dim=0)
+        if full_mask is not None:
+            full_mask = full_mask.repeat_interleave(sample_count, dim=0)
+        n_rows = batch_size * sample_count
+
+        # Preallocate the caches for every position the loop can append, so steps write in place.
+        # With `step_fns` and a window that never slides, the caches are static: max_context slots
+        # whatever the history and horizon, with the unfilled ones masked, so every step of every
+        # call sees the same shapes.
+        static = step_fns is not None and initial_seq_len + pred_len - 1 <= max_context
+        capacity = max_context if static else initial_seq_len - window_start + pred_len
+        for layer_cache in kv_cache + [cross_cache]:
+            layer_cache.reserve(capacity, static=static)
+        if static:
+            decode_s1, decode_s2 = step_fns
+            static_mask = torch.ones(x_token[0].size(0), capacity, dtype=torch.bool, device=x.device)
+            static_mask[:, :initial_seq_len] = False if full_mask is None else full_mask[:, :initial_seq_len]
+        else:
+            decode_s1, decode_s2 = model.decode_s1, model.decode_s2
+
+        if verbose:
+            ran = trange
+        else:
+            ran = range
+
+        for i in ran(pred_len):
+            current_seq_len = initial_seq_len + i
+
+            # Step 0 uses the logits of the shared prefill
+            if i > 0 and current_seq_len > max_context and window_mode == 'exact':
+                # Rebuild the caches over the slid window of max_context tokens
+                window_start = current_seq_len - max_context
+                input_tokens = [t[:, window_start:current_seq_len] for t in x_token]
+                current_stamp = full_stamp[:, window_start:current_seq_len, :]
+                kv_cache = model.init_kv_cache()
+                cross_cache = KVCache()
+                with stage("prefill", n_rows * max_context):
+                    s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp,
+                                                         padding_mask=_mask_window(full_mask, window_start, current_seq_len),
+                                                         kv_cache=kv_cache, last_only=True)
+            elif i > 0:
+                # Incremental step: only the token sampled in the previous step is new
+                n_evict = len(kv_cache[0]) + 1 - max_context
+                if n_evict > 0:
+                    for layer_cache in kv_cache + [cross_cache]:
+                        layer_cache.evict(n_evict)
+                    window_start += n_evict
+                if static:
+                    static_mask[:, current_seq_len - 1] = False
+                with stage("decode_s1", n_rows):
+                    s1_logits, context = decode_s1(sample_pre, sample_post, full_stamp[:, current_seq_len - 1:current_seq_len, :],
+                                                   padding_mask=static_mask if static else _mask_window(full_mask, window_start, current_seq_len),
+                                                   kv_cache=kv_cache)
+
+            s1_logits = s1_logits[:, -1, :]
+            with stage("sample", n_rows):
+                sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                uniform=None if uniforms is None else uniforms[:, i, 0])
+
+            with stage("decode_s2", n_rows):
+                s2_logits = decode_s2(context, sample_pre, padding_mask=static_mask if static else _mask_window(full_mask, window_start, current_seq_len),
+                                      kv_cache=cross_cache)
+            s2_logits = s2_logits[:, -1, :]
+            with stage("sample", n_rows):
+                sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                 uniform=None if uniforms is None else uniforms[:, i, 1])
+
+            x_token[0][:, current_seq_len:current_seq_len + 1] = sample_pre
+            x_token[1][:, current_seq_len:current_seq_len + 1] = sample_post
+
+        del kv_cache, cross_cache
+        return _decode_samples(tokenizer, x_token, full_mask, max_context, batch_size, sample_count, decode_chunk_size)
 
 
 def calc_time_stamps(x_timestamp):
@@ -453,13 +870,221 @@ def calc_time_stamps(x_timestamp):
     return time_df
 
 
+def _module_bytes(module):
+    return sum(t.numel() * t.element_size() for t in list(module.parameters()) + list(module.buffers()))
+
+
+def estimate_inference_memory(model, tokenizer, batch_size, seq_len, pred_len, sample_count=1, max_context=512, window_mode='exact', decode_chunk_size=None):
+    """
+    Estimates the peak memory (in bytes) of `auto_regressive_inference` for one batch.
+
+    The estimate is the size of the weights plus the largest of the inference phases: tokenizer
+    encoding and prefill (once per series), the decode loop (KV caches of all sample rows, plus a
+    full-window rebuild per step in 'exact' mode once the window slides) and tokenizer decoding
+    (`decode_chunk_size` rows at a time). The reference attention keeps about four
+    [n_heads, L, S] tensors alive per call, which dominates for long contexts.
+
+    Args:
+        model (Kronos), tokenizer (KronosTokenizer): The modules used for inference.
+        batch_size (int): Number of series in the batch.
+        seq_len (int): (Padded) history length.
+        pred_len, sample_count, max_context, window_mode, decode_chunk_size: See `auto_regressive_inference`.
+
+    Returns:
+        int: Estimated peak memory in bytes.
+    """
+    elem = next(model.parameters()).element_size()
+    rows = batch_size * sample_count
+    window = min(seq_len + pred_len, max_context)
+    decode_rows = rows if decode_chunk_size is None else min(rows, decode_chunk_size)
+
+    def block_activations(n, q_len, k_len, d_model, n_heads, ff_dim):
+        return n * (q_len * (8 * d_model + 3 * ff_dim) + 4 * n_heads * q_len * k_len) * elem
+
+    kv_per_row = (model.n_layers + 1) * 2 * window * model.d_model * elem
+    logits_per_row = 2 * (model.head.vocab_s1 + model.head.vocab_s2) * elem
+
+    encode = block_activations(batch_size, seq_len, seq_len, tokenizer.d_model, tokenizer.n_heads, tokenizer.ff_dim)
+    prefill_len = min(seq_len, max_context)
+    prefill = batch_size * kv_per_row + block_activations(batch_size, prefill_len, prefill_len, model.d_model, model.n_heads, model.ff_dim)
+    decode_loop = rows * (kv_per_row + logits_per_row) + block_activations(rows, 1, window, model.d_model, model.n_heads, model.ff_dim)
+    if window_mode == 'exact' and seq_len + pred_len > max_context:
+        decode_loop += block_activations(rows, window, window, model.d_model, model.n_heads, model.ff_dim)
+    decode = block_activations(decode_rows, window, window, tokenizer.d_model, tokenizer.n_heads, tokenizer.ff_dim)
+
+    return _module_bytes(model) + _module_bytes(tokenizer) + max(encode, prefill, decode_loop, decode)
+
+
+def plan_batches(seq_lens, pred_len, model, tokenizer, max_memory_mb, sample_count=1, max_context=512, window_mode='exact'):
+    """
+    Splits series into sub-batches whose estimated peak memory stays within `max_memory_mb`.
+
+    Series are packed greedily in the given order, so sorting them by length first keeps padding low.
+    A series that does not fit within the budget even on its own still gets a sub-batch of its own.
+
+    Args:
+        seq_lens (List[int]): History length of each series.
+        pred_len, sample_count, max_context, window_mode: See `auto_regressive_inference`.
+        model (Kronos), tokenizer (KronosTokenizer): The modules used for inference.
+        max_memory_mb (float): Memory budget in MiB.
+
+    Returns:
+        Tuple[List[List[int]], int]: Sub-batches of indices into `seq_lens`, and the number of sample rows
+                                     to pass through `tokenizer.decode` at once.
+    """
+    budget = max_memory_mb * 2 ** 20
+    weights = _module_bytes(model) + _module_bytes(tokenizer)
+    window = min(max(seq_lens) + pred_len, max_context)
+    decode_row = estimate_inference_memory(model, tokenizer, 1, window, 0, 1, max_context, window_mode) - weights
+    decode_chunk_size = max(1, int((budget - weights) // max(decode_row, 1)))
+
+    batches = []
+    batch_len = 0
+    for i, seq_len in enumerate(seq_lens):
+        candidate_len = max(batch_len, seq_len)
+        if batches and estimate_inference_memory(model, tokenizer, len(batches[-1]) + 1, candidate_len, pred_len, sample_count,
+                                                 max_context, window_mode, decode_chunk_size) <= budget:
+            batches[-1].append(i)
+            batch_len = candidate_len
+        else:
+            batches.append([i])
+            batch_len = seq_len
+    return batches, decode_chunk_size
+
+
+def left_pad(arrays, pad_value=0.0):
+    """
+    Left-pads a list of (seq_len_i, feat) arrays to a common length.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The stacked float32 array of shape (B, max_len, feat) and
+                                       a boolean padding mask of shape (B, max_len) (True = padding).
+    """
+    max_len = max(a.shape[0] for a in arrays)
+    batch = np.full((len(arrays), max_len, arrays[0].shape[1]), pad_value, dtype=np.float32)
+    padding_mask = np.ones((len(arrays), max_len), dtype=bool)
+    for i, a in enumerate(arrays):
+        n = a.shape[0]
+        batch[i, max_len - n:] = a
+        padding_mask[i, max_len - n:] = False
+    return batch, padding_mask
+
+
+def bucket_by_length(seq_lens, bucket_width=None):
+    """
+    Groups series indices for batching. Without `bucket_width` all series form one group; otherwise series
+    are sorted by length and a new group starts whenever the length exceeds the group's shortest by more
+    than `bucket_width`.
+    """
+    if bucket_width is None:
+        return [list(range(len(seq_lens)))]
+    buckets = []
+    for i in sorted(range(len(seq_lens)), key=lambda i: seq_lens[i]):
+        if not buckets or seq_lens[i] - seq_lens[buckets[-1][0]] > bucket_width:
+            buckets.append([])
+        buckets[-1].append(i)
+    return buckets
+
+
+class SeriesState:
+    """
+    Incremental inference state of a single series, see `KronosPredictor.init_state`.
+
+    Holds the raw history window (`x`, `x_stamp`) with the normalization statistics it was
+    tokenized with, the history tokens, the KV caches of the tokenizer encoder and decoder,
+    of the model and of the dependency-aware cross-attention, and the s1 logits and context
+    of the last position, from which the next step starts.
+    """
+
+    def __init__(self, x, x_stamp, x_mean, x_std, tokens, enc_cache, kv_cache, cross_cache, dec_cache, s1_logits, context):
+        self.x = x
+        self.x_stamp = x_stamp
+        self.x_mean = x_mean
+        self.x_std = x_std
+        self.tokens = tokens
+        self.enc_cache = enc_cache
+        self.kv_cache = kv_cache
+        self.cross_cache = cross_cache
+        self.dec_cache = dec_cache
+        self.s1_logits = s1_logits
+        self.context = context
+
+    def __len__(self):
+        return len(self.x)
+
+    def _caches(self):
+        return self.enc_cache + self.kv_cache + [self.cross_cache] + self.dec_cache
+
+    def to_dict(self, dtype=None):
+        """
+        Flattens the state into a dict of CPU tensors, loadable with `torch.load(..., weights_only=True)`.
+        `dtype` (e.g. torch.float16) optionally narrows the floating point tensors to save space.
+        """
+        def pack(t):
+            t = t.detach().cpu()
+            return t.to(dtype) if dtype is not None and t.is_floating_point() else t
+
+        def pack_cache(cache):
+            state = cache.to_dict()
+            if cache.k is not None:
+                state['k'], state['v'] = pack(cache.k), pack(cache.v)
+            return state
+
+        return {
+            'x': torch.from_numpy(self.x), 'x_stamp': torch.from_numpy(self.x_stamp),
+            'x_mean': torch.from_numpy(self.x_mean), 'x_std': torch.from_numpy(self.x_std),
+            'tokens': [t.cpu() for t in self.tokens],
+            'enc_cache': [pack_cache(c) for c in self.enc_cache],
+            'kv_cache': [pack_cache(c) for c in self.kv_cache],
+            'cross_cache': pack_cache(self.cross_cache),
+            'dec_cache': [pack_cache(c) for c in self.dec_cache],
+            's1_logits': pack(self.s1_logits), 'context': pack(self.context),
+        }
+
+    @classmethod
+    def from_dict(cls, state, device='cpu', dtype=torch.float32):
+        """Inverse of `to_dict`; floating point tensors are restored to `dtype` (the predictor's, see `KronosPredictor`) on `device`."""
+        def unpack(t):
+            t = t.to(device)
+            return t.to(dtype) if t.is_floating_point() else t
+
+        def unpack_cache(cache_state):
+            cache = KVCache.from_dict(cache_state, device)
+            if cache.k is not None:
+                cache.k, cache.v = cache.k.to(dtype), cache.v.to(dtype)
+            return cache
+
+        return cls(
+            state['x'].numpy(), state['x_stamp'].numpy(), state['x_mean'].numpy(), state['x_std'].numpy(),
+            [t.to(device) for t in state['tokens']],
+            [unpack_cache(c) for c in state['enc_cache']],
+            [unpack_cache(c) for c in state['kv_cache']],
+            unpack_cache(state['cross_cache']),
+            [unpack_cache(c) for c in state['dec_cache']],
+            unpack(state['s1_logits']), unpack(state['context']),
+        )
+
+
 class KronosPredictor:
 
-    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5):
+    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5, window_mode="exact", attn_backend="sdpa",
+                 compile_decode=False, quantize=None, dtype="float32"):
+        if window_mode not in WINDOW_MODES:
+            raise ValueError(f"window_mode must be one of {WINDOW_MODES}, got {window_mode!r}.")
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"quantize must be one of {QUANTIZE_MODES}, got {quantize!r}.")
+        if quantize is not None and torch.device(device).type != "cpu":
+            raise ValueError(f"quantize={quantize!r} is only supported on CPU, got device {device!r}.")
+        if dtype not in INFERENCE_DTYPES:
+            raise ValueError(f"dtype must be one of {tuple(INFERENCE_DTYPES)}, got {dtype!r}.")
+        if quantize is not None and dtype != "float32":
+            raise ValueError(f"quantize={quantize!r} requires dtype='float32', got {dtype!r}.")
+        _check_dtype_support(INFERENCE_DTYPES[dtype], device)
         self.tokenizer = tokenizer
         self.model = model
         self.max_context = max_context
         self.clip = clip
+        self.window_mode = window_mode
         self.price_cols = ['open', 'high', 'low', 'close']
         self.vol_col = 'volume'
         self.amt_vol = 'amount'
@@ -468,19 +1093,48 @@ class KronosPredictor:
 
         self.tokenizer = self.tokenizer.to(self.device)
         self.model = self.model.to(self.device)
-
-    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose):
-
-        x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device)
+        self.model.fold_embeddings()
+        # Weights, folded tables and activations in `dtype`. Attention softmax, RMSNorm statistics, rotary
+        # angles and sampling are computed in float32, and predictions are de-normalized in float32.
+        # Reduced precision is not batch-independent: matmul blocking and accumulation order depend on the batch
+        # size, and the rounding differences are amplified by autoregressive sampling, so the same series with the
+        # same seed can drift by a few percent (up to ~5% on close, see benchmarks/inference_suite.py --dtype) when
+        # batched with other series. Use float32 where forecasts must be reproducible across batches and shards.
+        self.dtype = INFERENCE_DTYPES[dtype]
+        self.tokenizer = self.tokenizer.to(self.dtype)
+        self.model = self.model.to(self.dtype)
+        self.quantize = quantize
+        if quantize == "int8":
+            # The token embedding projection is folded into lookup tables and must stay in float for re-folding.
+            # The tokenizer's input embedding and quantizer projection are tiny but decide the token bits.
+            quantize_linear_int8(self.model, skip={"embedding.fusion_proj"})
+            quantize_linear_int8(self.tokenizer, skip={"embed", "quant_embed"})
+        # See ATTENTION_BACKENDS in model/module.py
+        set_attention_backend(self.model, attn_backend)
+        set_attention_backend(self.tokenizer, attn_backend)
+        for module in list(self.model.modules()) + list(self.tokenizer.modules()):
+            if isinstance(module, RotaryPositionalEmbedding):
+                module.precompute(max_context)
+        # Opt-in: torch.compile'd single-position steps on static-shape caches, see `auto_regressive_inference`
+        self.step_fns = compile_decode_steps(self.model) if compile_decode else None
+
+    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, padding_mask=None, decode_chunk_size=None, seed=None):
+
+        x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device, self.dtype)
         x_stamp_tensor = torch.from_numpy(np.array(x_stamp).astype(np.float32)).to(self.device)
         y_stamp_tensor = torch.from_numpy(np.array(y_stamp).astype(np.float32)).to(self.device)
-
-        preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
-                                          self.clip, T, top_k, top_p, sample_count, verbose)
+        if padding_mask is not None:
+            padding_mask = torch.from_numpy(np.asarray(padding_mask, dtype=bool)).to(self.device)
+
+        with stage("generate", x_tensor.size(0) * sample_count * pred_len):
+            preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
+                                              self.clip, T, top_k, top_p, sample_count, verbose, window_mode=self.window_mode,
+                                              padding_mask=padding_mask, decode_chunk_size=decode_chunk_size, seed=seed,
+                                              step_fns=self.step_fns)
         preds = preds[:, -pred_len:, :]
         return preds
 
-    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, seed=None):
 
         if not isinstance(df, pd.DataFrame):
             raise ValueError("Input must be a pandas DataFrame.")
@@ -488,44 +1142,52 @@ class KronosPredictor:
         if not all(col in df.columns for col in self.price_cols):
             raise ValueError(f"Price columns {self.price_cols} not found in DataFrame.")
 
-        df = df.copy()
-        if self.vol_col not in df.columns:
-            df[self.vol_col] = 0.0  # Fill missing volume with zeros
-            df[self.amt_vol] = 0.0  # Fill missing amount with zeros
-        if self.amt_vol not in df.columns and self.vol_col in df.columns:
-            df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
+        with stage("prepare"):
+            df = df.copy()
+            if self.vol_col not in df.columns:
+                df[self.vol_col] = 0.0  # Fill missing volume with zeros
+                df[self.amt_vol] = 0.0  # Fill missing amount with zeros
+            if self.amt_vol not in df.columns and self.vol_col in df.columns:
+                df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
 
-        if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
-            raise ValueError("Input DataFrame contains NaN values in price or volume columns.")
+            if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
+                raise ValueError("Input DataFrame contains NaN values in price or volume columns.")
 
-        x_time_df = calc_time_stamps(x_timestamp)
-        y_time_df = calc_time_stamps(y_timestamp)
+        with stage("calc_time_stamps"):
+            x_time_df = calc_time_stamps(x_timestamp)
+            y_time_df = calc_time_stamps(y_timestamp)
 
         x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(np.float32)
         x_stamp = x_time_df.values.astype(np.float32)
         y_stamp = y_time_df.values.astype(np.float32)
 
-        x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
+        with stage("normalize"):
+            x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
 
-        x = (x - x_mean) / (x_std + 1e-5)
-        x = np.clip(x, -self.clip, self.clip)
+            x = (x - x_mean) / (x_std + 1e-5)
+            x = np.clip(x, -self.clip, self.clip)
 
         x = x[np.newaxis, :]
         x_stamp = x_stamp[np.newaxis, :]
         y_stamp = y_stamp[np.newaxis, :]
 
-        preds = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose)
+        preds = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, seed=seed)
 
         preds = preds.squeeze(0)
-        preds = preds * (x_std + 1e-5) + x_mean
+        with stage("denormalize"):
+            preds = preds * (x_std + 1e-5) + x_mean
 
-        pred_df = pd.DataFrame(preds, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp)
+        with stage("assemble"):
+            pred_df = pd.DataFrame(preds, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp)
         return pred_df
 
 
-    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, bucket_width=None, max_memory_mb=None, seed=None):
         """
-        Perform parallel (batch) prediction on multiple time series. All series must have the same historical length and prediction length (pred_len).
+        Perform parallel (batch) prediction on multiple time series. All series must have the same prediction length (pred_len).
+
+        Series with different historical lengths are left-padded to the longest one in their batch and
+        padded positions are masked out, so each forecast matches running the series on its own.
 
         Args:
             df_list (List[pd.DataFrame]): List of input DataFrames, each containing price columns and optional volume/amount columns.
@@ -537,6 +1199,14 @@ class KronosPredictor:
             top_p (float): Top-p (nucleus sampling) threshold.
             sample_count (int): Number of parallel samples per series, automatically averaged internally.
             verbose (bool): Whether to display autoregressive progress.
+            bucket_width (int, optional): If set, series are sorted by historical length and grouped so that lengths
+                                          within a group differ by at most `bucket_width` rows; each group runs as its
+                                          own batch to limit padding waste. Defaults to None (a single batch).
+            max_memory_mb (float, optional): If set, each batch is split into sub-batches whose estimated peak memory
+                                             (see `plan_batches`) stays within this budget, and run one after another.
+            seed (int or List[int], optional): Per-series sampling seed, see `auto_regressive_inference`. With a seed,
+                                               a series samples the same tokens whatever else is in the batch, and its
+                                               forecast is equal up to float rounding.
 
         Returns:
             List[pd.DataFrame]: List of prediction results in the same order as input, each DataFrame contains
@@ -553,74 +1223,265 @@ class KronosPredictor:
         x_list = []
         x_stamp_list = []
         y_stamp_list = []
+
+        with stage("prepare"):
+            for i in range(num_series):
+                df = df_list[i]
+                if not isinstance(df, pd.DataFrame):
+                    raise ValueError(f"Input at index {i} is not a pandas DataFrame.")
+                if not all(col in df.columns for col in self.price_cols):
+                    raise ValueError(f"DataFrame at index {i} is missing price columns {self.price_cols}.")
+
+                df = df.copy()
+                if self.vol_col not in df.columns:
+                    df[self.vol_col] = 0.0
+                    df[self.amt_vol] = 0.0
+                if self.amt_vol not in df.columns and self.vol_col in df.columns:
+                    df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
+
+                if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
+                    raise ValueError(f"DataFrame at index {i} contains NaN values in price or volume columns.")
+
+                x_timestamp = x_timestamp_list[i]
+                y_timestamp = y_timestamp_list[i]
+
+                with stage("calc_time_stamps"):
+                    x_time_df = calc_time_stamps(x_timestamp)
+                    y_time_df = calc_time_stamps(y_timestamp)
+
+                x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(np.float32)
+                x_stamp = x_time_df.values.astype(np.float32)
+                y_stamp = y_time_df.values.astype(np.float32)
+
+                if x.shape[0] != x_stamp.shape[0]:
+                    raise ValueError(f"Inconsistent lengths at index {i}: x has {x.shape[0]} vs x_stamp has {x_stamp.shape[0]}.")
+                if y_stamp.shape[0] != pred_len:
+                    raise ValueError(f"y_timestamp length at index {i} should equal pred_len={pred_len}, got {y_stamp.shape[0]}.")
+
+                x_list.append(x)
+                x_stamp_list.append(x_stamp)
+                y_stamp_list.append(y_stamp)
+
+        preds = self.predict_arrays(x_list, x_stamp_list, y_stamp_list, pred_len, T, top_k, top_p, sample_count, verbose, bucket_width,
+                                    max_memory_mb, seed)
+
+        with stage("assemble"):
+            pred_dfs = []
+            for i in range(num_series):
+                pred_df = pd.DataFrame(preds[i], columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp_list[i])
+                pred_dfs.append(pred_df)
+
+        return pred_dfs
+
+    def predict_arrays(self, x_list, x_stamp_list, y_stamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=False, bucket_width=None, max_memory_mb=None, seed=None):
+        """
+        Batch prediction on already-assembled arrays, skipping the per-series DataFrame handling of `predict_batch`.
+        With `quantize`, series run one at a time so forecasts do not depend on the batch, see `quantize_linear_int8`.
+
+        Args:
+            x_list (List[np.ndarray]): Raw (un-normalized) inputs of shape (seq_len_i, 6) with columns
+                                       `open, high, low, close, volume, amount`.
+            x_stamp_list (List[np.ndarray]): Time features of shape (seq_len_i, 5), see `calc_time_stamps`.
+            y_stamp_list (List[np.ndarray]): Future time features of shape (pred_len, 5).
+            pred_len, sample_count, verbose, bucket_width, max_memory_mb: See `predict_batch`.
+            T, top_k, top_p: Sampling parameters, either scalars or per-series sequences of length len(x_list).
+            seed: Sampling seed, None, an int or a per-series sequence, see `predict_batch`.
+
+        Returns:
+            List[np.ndarray]: De-normalized predictions of shape (pred_len, 6), in input order.
+        """
+        num_series = len(x_list)
+
+        x_norm_list = []
         means = []
         stds = []
         seq_lens = []
         y_lens = []
 
-        for i in range(num_series):
-            df = df_list[i]
-            if not isinstance(df, pd.DataFrame):
-                raise ValueError(f"Input at index {i} is not a pandas DataFrame.")
-            if not all(col in df.columns for col in self.price_cols):
-                raise ValueError(f"DataFrame at index {i} is missing price columns {self.price_cols}.")
+        with stage("normalize"):
+            for i in range(num_series):
+                x = np.asarray(x_list[i], dtype=np.float32)
+                x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
+                x_norm = (x - x_mean) / (x_std + 1e-5)
+                x_norm = np.clip(x_norm, -self.clip, self.clip)
 
-            df = df.copy()
-            if self.vol_col not in df.columns:
-                df[self.vol_col] = 0.0
-                df[self.amt_vol] = 0.0
-            if self.amt_vol not in df.columns and self.vol_col in df.columns:
-                df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
+                x_norm_list.append(x_norm)
+                means.append(x_mean)
+                stds.append(x_std)
 
-            if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
-                raise ValueError(f"DataFrame at index {i} contains NaN values in price or volume columns.")
+                seq_lens.append(x_norm.shape[0])
+                y_lens.append(np.shape(y_stamp_list[i])[0])
+
+        # Require all series to have consistent prediction lengths for batch processing
+        if len(set(y_lens)) != 1:
+            raise ValueError(f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}")
 
-            x_timestamp = x_timestamp_list[i]
-            y_timestamp = y_timestamp_list[i]
+        batches = []
+        for bucket in bucket_by_length(seq_lens, bucket_width):
+            if max_memory_mb is None:
+                batches.append((bucket, None))
+                continue
+            bucket = sorted(bucket, key=lambda i: seq_lens[i])
+            sub_batches, decode_chunk_size = plan_batches([seq_lens[i] for i in bucket], pred_len, self.model, self.tokenizer, max_memory_mb,
+                                                          sample_count, self.max_context, self.window_mode)
+            batches.extend(([bucket[j] for j in sub_batch], decode_chunk_size) for sub_batch in sub_batches)
+        if self.quantize is not None:
+            # Dynamic int8 picks one activation scale per tensor, so series sharing a batch (and their padding)
+            # would change each other's forecasts. Run every series on its own to keep results batch-independent.
+            batches = [([i], decode_chunk_size) for bucket, decode_chunk_size in batches for i in bucket]
+
+        preds = [None] * num_series
+        for bucket, decode_chunk_size in batches:
+            x_batch, padding_mask = left_pad([x_norm_list[i] for i in bucket])       # (B, seq_len, feat), (B, seq_len)
+            x_stamp_batch, _ = left_pad([x_stamp_list[i] for i in bucket])     # (B, seq_len, time_feat)
+            y_stamp_batch = np.stack([y_stamp_list[i] for i in bucket], axis=0).astype(np.float32)  # (B, pred_len, time_feat)
+            if not padding_mask.any():
+                padding_mask = None
+
+            bucket_T, bucket_top_k, bucket_top_p, bucket_seed = (param if np.ndim(param) == 0 else np.asarray(param)[bucket]
+                                                                 for param in (T, top_k, top_p, seed))
+            bucket_preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, bucket_T, bucket_top_k, bucket_top_p, sample_count, verbose,
+                                         padding_mask=padding_mask, decode_chunk_size=decode_chunk_size, seed=bucket_seed)
+            # bucket_preds: (B, pred_len, feat)
+            with stage("denormalize"):
+                for j, i in enumerate(bucket):
+                    preds[i] = bucket_preds[j] * (stds[i] + 1e-5) + means[i]
 
-            x_time_df = calc_time_stamps(x_timestamp)
-            y_time_df = calc_time_stamps(y_timestamp)
+        return preds
 
-            x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(np.float32)
-            x_stamp = x_time_df.values.astype(np.float32)
-            y_stamp = y_time_df.values.astype(np.float32)
 
-            if x.shape[0] != x_stamp.shape[0]:
-                raise ValueError(f"Inconsistent lengths at index {i}: x has {x.shape[0]} vs x_stamp has {x_stamp.shape[0]}.")
-            if y_stamp.shape[0] != pred_len:
-                raise ValueError(f"y_timestamp length at index {i} should equal pred_len={pred_len}, got {y_stamp.shape[0]}.")
+    def init_state(self, x, x_stamp):
+        """
+        Builds the incremental inference state of one series.
 
-            x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
-            x_norm = (x - x_mean) / (x_std + 1e-5)
-            x_norm = np.clip(x_norm, -self.clip, self.clip)
+        The history window (at most `max_context` rows) is normalized with its own statistics, tokenized
+        and prefilled once. `append_state` then extends the state by one row at the cost of a single
+        encoder, transformer and decoder step, and `forecast_state` samples a forecast from it without
+        re-running the history.
 
-            x_list.append(x_norm)
-            x_stamp_list.append(x_stamp)
-            y_stamp_list.append(y_stamp)
-            means.append(x_mean)
-            stds.append(x_std)
+        Args:
+            x (np.ndarray): Raw (un-normalized) history of shape (seq_len, 6), see `predict_arrays`.
+            x_stamp (np.ndarray): Time features of shape (seq_len, 5).
 
-            seq_lens.append(x_norm.shape[0])
-            y_lens.append(y_stamp.shape[0])
+        Returns:
+            SeriesState: The state, with tensors on `self.device`.
+        """
+        x = np.asarray(x, dtype=np.float32)[-self.max_context:]
+        x_stamp = np.asarray(x_stamp, dtype=np.float32)[-self.max_context:]
+        x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
 
-        # Require all series to have consistent historical and prediction lengths for batch processing
-        if len(set(seq_lens)) != 1:
-            raise ValueError(f"Parallel prediction requires all series to have consistent historical lengths, got: {seq_lens}")
-        if len(set(y_lens)) != 1:
-            raise ValueError(f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}")
+        with torch.no_grad():
+            x_tensor = self._normalize_rows(x, x_mean, x_std)
+            enc_cache = [KVCache() for _ in self.tokenizer.encoder]
+            tokens = list(self.tokenizer.encode(x_tensor, half=True, kv_cache=enc_cache))
+            dec_cache = [KVCache() for _ in self.tokenizer.decoder]
+            self.tokenizer.decode(tokens, half=True, kv_cache=dec_cache)
 
-        x_batch = np.stack(x_list, axis=0).astype(np.float32)           # (B, seq_len, feat)
-        x_stamp_batch = np.stack(x_stamp_list, axis=0).astype(np.float32) # (B, seq_len, time_feat)
-        y_stamp_batch = np.stack(y_stamp_list, axis=0).astype(np.float32) # (B, pred_len, time_feat)
+            kv_cache = self.model.init_kv_cache()
+            cross_cache = KVCache()
+            stamp = torch.from_numpy(x_stamp).unsqueeze(0).to(self.device)
+            s1_logits, context = self.model.decode_s1(tokens[0], tokens[1], stamp, kv_cache=kv_cache, last_only=True)
+            self.model.cache_context(context[:, :-1], cross_cache)
 
-        preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose)
-        # preds: (B, pred_len, feat)
+        return SeriesState(x, x_stamp, x_mean, x_std, tokens, enc_cache, kv_cache, cross_cache, dec_cache,
+                           s1_logits[:, -1], context[:, -1:])
 
-        pred_dfs = []
-        for i in range(num_series):
-            preds_i = preds[i] * (stds[i] + 1e-5) + means[i]
-            pred_df = pd.DataFrame(preds_i, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp_list[i])
-            pred_dfs.append(pred_df)
+    def append_state(self, state, x_row, x_stamp_row, max_len=None):
+        """
+        Appends one observed row to `state` in place.
 
-        return pred_dfs
+        The row is normalized with the statistics the state was built with, so the state drifts from a
+        fresh `init_state` as the window statistics change; rebuild it once they have moved too far.
+        Once the state holds more than `max_len` rows (default `max_context`), the oldest position is
+        evicted from every cache, with the same approximation as `window_mode='approx'`.
+
+        Args:
+            state (SeriesState): State from `init_state`.
+            x_row (np.ndarray): Raw row of shape (6,).
+            x_stamp_row (np.ndarray): Time features of shape (5,).
+            max_len (int, optional): Maximum number of rows kept in the state.
+        """
+        max_len = min(max_len or self.max_context, self.max_context)
+        x_row = np.asarray(x_row, dtype=np.float32).reshape(1, -1)
+        x_stamp_row = np.asarray(x_stamp_row, dtype=np.float32).reshape(1, -1)
+
+        with torch.no_grad():
+            x_tensor = self._normalize_rows(x_row, state.x_mean, state.x_std)
+            tokens = self.tokenizer.encode(x_tensor, half=True, kv_cache=state.enc_cache)
+            self.tokenizer.decode(tokens, half=True, kv_cache=state.dec_cache)
+
+            # The previous last position becomes a regular context position of the cross-attention
+            self.model.cache_context(state.context, state.cross_cache)
+            stamp = torch.from_numpy(x_stamp_row).unsqueeze(0).to(self.device)
+            s1_logits, context = self.model.decode_s1(tokens[0], tokens[1], stamp, kv_cache=state.kv_cache)
+
+        state.s1_logits, state.context = s1_logits[:, -1], context
+        state.tokens = [torch.cat([t, new], dim=1) for t, new in zip(state.tokens, tokens)]
+        state.x = np.concatenate([state.x, x_row], axis=0)
+        state.x_stamp = np.concatenate([state.x_stamp, x_stamp_row], axis=0)
+
+        n_evict = len(state) - max_len
+        if n_evict > 0:
+            for cache in state._caches():
+                cache.evict(n_evict)
+            state.tokens = [t[:, n_evict:] for t in state.tokens]
+            state.x, state.x_stamp = state.x[n_evict:], state.x_stamp[n_evict:]
+
+    def forecast_state(self, state, y_stamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, seed=None):
+        """
+        Samples a forecast continuing `state`, which is left unchanged.
+
+        Only the `pred_len` new positions are run through the model and the tokenizer decoder, on copies
+        of the state's caches. With the same `seed`, the result matches `predict_arrays` on the state's
+        window up to float round-off, as long as the state has not been appended to.
+
+        Args:
+            state (SeriesState): State from `init_state` / `append_state`.
+            y_stamp (np.ndarray): Future time features of shape (pred_len, 5).
+            pred_len, T, top_k, top_p, sample_count: See `predict_batch`.
+            seed (int, optional): Sampling seed of the series, see `auto_regressive_inference`.
 
+        Returns:
+            np.ndarray: De-normalized prediction of shape (pred_len, 6).
+        """
+        with torch.no_grad():
+            kv_cache = [c.copy() for c in state.kv_cache]
+            cross_cache = state.cross_cache.copy()
+            dec_cache = [c.copy() for c in state.dec_cache]
+            for cache in kv_cache + [cross_cache] + dec_cache:
+                cache.repeat_interleave(sample_count)
+            s1_logits = state.s1_logits.repeat_interleave(sample_count, dim=0)
+            context = state.context.repeat_interleave(sample_count, dim=0)
+            stamp = torch.from_numpy(np.asarray(y_stamp, dtype=np.float32)).unsqueeze(0).to(self.device)
+            stamp = stamp.repeat_interleave(sample_count, dim=0)
+
+            T, top_k, top_p = _expand_sampling_params(T, top_k, top_p, 1, sample_count, self.device)
+            uniforms = _draw_uniforms(seed, 1, sample_count, pred_len, self.device)
+
+            pred_tokens = [[], []]
+            for i in range(pred_len):
+                if i > 0:
+                    n_evict = len(kv_cache[0]) + 1 - self.max_context
+                    for cache in kv_cache + [cross_cache]:
+                        cache.evict(n_evict)
+                    s1_logits, context = self.model.decode_s1(sample_pre, sample_post, stamp[:, i - 1:i], kv_cache=kv_cache)
+                    s1_logits = s1_logits[:, -1]
+                sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                uniform=None if uniforms is None else uniforms[:, i, 0])
+                s2_logits = self.model.decode_s2(context, sample_pre, kv_cache=cross_cache)[:, -1]
+                sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True,
+                                                 uniform=None if uniforms is None else uniforms[:, i, 1])
+                pred_tokens[0].append(sample_pre)
+                pred_tokens[1].append(sample_post)
+
+            # The decoder is causal: decode only the new tokens against the cached history window
+            for cache in dec_cache:
+                cache.evict(len(cache) + pred_len - self.max_context)
+            z = self.tokenizer.decode([torch.cat(t, dim=1) for t in pred_tokens], half=True, kv_cache=dec_cache)
+            preds = z.reshape(sample_count, pred_len, -1).float().mean(dim=0).cpu().numpy()
+
+        return preds * (state.x_std + 1e-5) + state.x_mean
+
+    def _normalize_rows(self, x, x_mean, x_std):
+        x = np.clip((x - x_mean) / (x_std + 1e-5), -self.clip, self.clip)
+        return torch.from_numpy(x.astype(np.float32)).unsqueeze(0).to(self.device, self.dtype)
@@ -1,4 +1,5 @@
 import math
+import functools
 
 from einops import rearrange, reduce
 import torch
@@ -239,6 +240,20 @@ class BSQuantizer(nn.Module):
         )
         return (bits * indices).sum(-1)
 
+    def indices(self, z, half=False):
+        """
+        Inference-only path: returns the `z_indices` of `forward` without the losses.
+
+        A latent dimension is quantized to +1 iff it is positive, and normalization does not change
+        signs, so the indices follow directly from `z > 0`. This skips the normalization, the soft
+        entropy and commit losses, the group indices and the codebook usage statistics.
+        """
+        # Same ±1 codes as the quantizer (zero maps to -1), without normalizing or computing losses
+        codes = torch.where(z > 0, 1, -1)
+        if half:
+            return [self.bits_to_indices(codes[..., :self.s1_bits]), self.bits_to_indices(codes[..., self.s1_bits:])]
+        return self.bits_to_indices(codes)
+
     def forward(self, z, half=False):
         z = F.normalize(z, dim=-1)
         quantized, bsq_loss, metrics = self.bsq(z)
@@ -262,8 +277,32 @@ class RMSNorm(torch.nn.Module):
 
     def forward(self, x):
         output = self._norm(x.float()).type_as(x)
+        if self.weight is None:
+            # Folded into the following projections by `pop_weight`
+            return output
         return output * self.weight
 
+    def pop_weight(self):
+        """Removes and returns the weight, so that it can be folded into the linear layers consuming the output."""
+        weight, self.weight = self.weight, None
+        return weight
+
+
+def fuse_linear(linears, scale=None):
+    """
+    Stacks linear layers applied to the same input into one layer, whose output is the concatenation
+    of their outputs. `scale`, if given, is a per-input-feature scale folded into the weights.
+    """
+    weight = torch.cat([linear.weight for linear in linears])
+    if scale is not None:
+        weight = weight * scale
+    has_bias = linears[0].bias is not None
+    fused = nn.Linear(weight.shape[1], weight.shape[0], bias=has_bias, device=weight.device, dtype=weight.dtype)
+    fused.weight = nn.Parameter(weight, requires_grad=linears[0].weight.requires_grad)
+    if has_bias:
+        fused.bias = nn.Parameter(torch.cat([linear.bias for linear in linears]), requires_grad=linears[0].bias.requires_grad)
+    return fused
+
 
 class FeedForward(nn.Module):
     def __init__(self, d_model, ff_dim, ffn_dropout_p=0.0):
@@ -272,33 +311,68 @@ class FeedForward(nn.Module):
         self.w1 = nn.Linear(d_model, ff_dim, bias=False)
         self.w3 = nn.Linear(d_model, ff_dim, bias=False)
         self.w2 = nn.Linear(ff_dim, d_model, bias=False)
+        self.w13 = None  # Fused w1/w3, see `fuse_projections`
         self.ffn_dropout = nn.Dropout(ffn_dropout_p)
 
+    @torch.no_grad()
+    def fuse_projections(self, scale=None):
+        """Replaces w1 and w3 by a single `w13` projection; `scale` is folded into its input features."""
+        self.w13 = fuse_linear([self.w1, self.w3], scale)
+        self.w1 = self.w3 = None
+
     def forward(self, x):
+        if self.w13 is not None:
+            x1, x3 = self.w13(x).chunk(2, dim=-1)
+            return self.ffn_dropout(self.w2(F.silu(x1) * x3))
         return self.ffn_dropout(self.w2(F.silu(self.w1(x)) * self.w3(x)))
 
 
 class RotaryPositionalEmbedding(nn.Module):
+    # cos/sin tables shared by every instance, keyed by (dim, device, dtype). Rows only depend on
+    # the position, so one table serves all layers and any offset is a slice.
+    _shared_tables = {}
+
     def __init__(self, dim):
         super().__init__()
+        self.dim = dim
         inv_freq = 1.0 / (10000 ** (torch.arange(0, dim, 2).float() / dim))
         self.register_buffer("inv_freq", inv_freq)
-        self.seq_len_cached = None
-        self.cos_cached = None
-        self.sin_cached = None
-
-    def _update_cos_sin_cache(self, x, seq_len):
-        if seq_len != self.seq_len_cached:
-            self.seq_len_cached = seq_len
-            t = torch.arange(seq_len, device=x.device).type_as(self.inv_freq)
-            freqs = torch.einsum('i,j->ij', t, self.inv_freq)
-            emb = torch.cat((freqs, freqs), dim=-1).to(x.device)
-            self.cos_cached = emb.cos()[None, None, :, :]
-            self.sin_cached = emb.sin()[None, None, :, :]
-        return self.cos_cached, self.sin_cached
-
-    def forward(self, q, k):
-        cos, sin = self._update_cos_sin_cache(q, q.shape[-2])
+
+    def precompute(self, max_len):
+        """Makes sure the shared tables cover positions [0, max_len), e.g. up to max_context at load time."""
+        self._tables(max_len)
+
+    def _tables(self, seq_len):
+        key = (self.dim, self.inv_freq.device, self.inv_freq.dtype)
+        tables = self._shared_tables.get(key)
+        if tables is None or tables[0].size(0) < seq_len:
+            # Grow geometrically, so decoding past the precomputed length only rebuilds O(log n) times
+            length = seq_len if tables is None else max(seq_len, 2 * tables[0].size(0))
+            inv_freq = self.inv_freq
+            if inv_freq.dtype != torch.float32:
+                # bf16/fp16 can neither hold the frequencies nor positions past a few hundred exactly,
+                # so the angles are computed in float32 and only the finished tables are narrowed
+                inv_freq = 1.0 / (10000 ** (torch.arange(0, self.dim, 2, device=inv_freq.device).float() / self.dim))
+            t = torch.arange(length, device=inv_freq.device).type_as(inv_freq)
+            freqs = torch.einsum('i,j->ij', t, inv_freq)
+            emb = torch.cat((freqs, freqs), dim=-1)
+            tables = (emb.cos().to(self.inv_freq.dtype), emb.sin().to(self.inv_freq.dtype))
+            self._shared_tables[key] = tables
+        return tables
+
+    def forward(self, q, k, offset=0):
+        """
+        q, k: [batch, n_heads, seq_len, head_dim]
+        offset: Position of the first row, either an int shared by the batch or a tensor [batch] of per-sequence offsets
+        """
+        seq_len = q.shape[-2]
+        if torch.is_tensor(offset):
+            positions = offset.view(-1, 1) + torch.arange(seq_len, device=offset.device)
+            cos, sin = self._tables(int(positions.max()) + 1)
+            cos, sin = cos[positions].unsqueeze(1), sin[positions].unsqueeze(1)
+        else:
+            cos, sin = self._tables(offset + seq_len)
+            cos, sin = cos[offset:offset + seq_len], sin[offset:offset + seq_len]
         return (
             (q * cos) + (self._rotate_half(q) * sin),
             (k * cos) + (self._rotate_half(k) * sin),
@@ -315,27 +389,212 @@ def scaled_dot_product_attention(query, key, value, attn_mask=None, dropout_p=0.
     attn_bias = torch.zeros(L, S, dtype=query.dtype).to(query.device)
 
     if is_causal:
-        assert attn_mask is None
-        temp_mask = torch.ones(L, S, dtype=torch.bool).tril(diagonal=0).to(query.device)
+        # Queries are the last L of S positions (L < S when keys come from a KV cache)
+        temp_mask = torch.ones(L, S, dtype=torch.bool).tril(diagonal=S - L).to(query.device)
         attn_bias.masked_fill_(temp_mask.logical_not(), float("-inf"))
         attn_bias.to(query.dtype)
 
-    attn_weight = query @ key.transpose(-2, -1) * scale_factor
+    # Scores are masked and normalized in float32, also when query/key are bf16/fp16
+    attn_weight = (query @ key.transpose(-2, -1) * scale_factor).float()
     attn_weight += attn_bias
 
     if attn_mask is not None:
         attn_mask_bias = torch.zeros_like(attn_weight)
         if attn_mask.dtype == torch.bool:
-            attn_mask_bias.masked_fill_(attn_mask, float("-inf"))
+            # A finite fill keeps rows whose keys are all padding (left-padded queries) free of NaNs
+            attn_mask_bias.masked_fill_(attn_mask, torch.finfo(attn_weight.dtype).min)
         else:
             attn_mask_bias += attn_mask
         attn_weight += attn_mask_bias
 
-    attn_weight = torch.softmax(attn_weight, dim=-1)
+    attn_weight = torch.softmax(attn_weight, dim=-1).to(value.dtype)
     attn_weight = torch.dropout(attn_weight, dropout_p, train=training)
     return attn_weight @ value
 
 
+# "reference": `scaled_dot_product_attention` above; "sdpa": PyTorch's fused F.scaled_dot_product_attention;
+# "cached_mask": the reference math with a cached causal bias and the padding mask applied in place.
+ATTENTION_BACKENDS = ("reference", "sdpa", "cached_mask")
+
+
+@functools.lru_cache(maxsize=16)
+def _causal_bias(L, S, device, dtype):
+    """Additive causal bias for L queries at the last L of S key positions. Shared between calls, never modify it in place."""
+    return torch.full((L, S), float("-inf"), device=device, dtype=dtype).triu(diagonal=S - L + 1)
+
+
+def _cached_mask_attention(query, key, value, attn_mask=None, dropout_p=0.0, is_causal=False, scale=None, training=True):
+    L, S = query.size(-2), key.size(-2)
+    scale_factor = 1 / math.sqrt(query.size(-1)) if scale is None else scale
+
+    attn_weight = (query @ key.transpose(-2, -1) * scale_factor).float()
+    if attn_mask is not None:
+        if attn_mask.dtype == torch.bool:
+            # Same finite fill as the reference; applied before the causal bias so it cannot unmask future positions
+            attn_weight.masked_fill_(attn_mask, torch.finfo(attn_weight.dtype).min)
+        else:
+            attn_weight += attn_mask
+    if is_causal and L > 1:
+        # A single query is the last position and may attend to every key
+        attn_weight += _causal_bias(L, S, query.device, attn_weight.dtype)
+
+    attn_weight = torch.softmax(attn_weight, dim=-1).to(value.dtype)
+    attn_weight = torch.dropout(attn_weight, dropout_p, train=training)
+    return attn_weight @ value
+
+
+def _sdpa_attention(query, key, value, attn_mask=None, dropout_p=0.0, is_causal=False, scale=None, training=True):
+    L, S = query.size(-2), key.size(-2)
+    kwargs = {"dropout_p": dropout_p if training else 0.0}
+    if scale is not None:
+        kwargs["scale"] = scale
+
+    if attn_mask is not None and attn_mask.dtype == torch.bool:
+        # A boolean mask would turn rows whose keys are all padding into NaNs, use the reference's finite fill instead
+        attn_mask = torch.zeros(attn_mask.shape, dtype=query.dtype, device=query.device) \
+            .masked_fill_(attn_mask, torch.finfo(query.dtype).min)
+    if is_causal and L > 1:
+        if attn_mask is None and L == S:
+            return F.scaled_dot_product_attention(query, key, value, is_causal=True, **kwargs)
+        # F.scaled_dot_product_attention aligns its causal mask to the first key, cached keys need it aligned to the last
+        causal_bias = _causal_bias(L, S, query.device, query.dtype)
+        attn_mask = causal_bias if attn_mask is None else attn_mask + causal_bias
+    return F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, **kwargs)
+
+
+_ATTENTION_FNS = {
+    "reference": scaled_dot_product_attention,
+    "sdpa": _sdpa_attention,
+    "cached_mask": _cached_mask_attention,
+}
+
+
+def attention(query, key, value, attn_mask=None, dropout_p=0.0, is_causal=False, scale=None, training=True, backend="reference"):
+    """
+    Dispatches to one of the `ATTENTION_BACKENDS`. All backends take the arguments of `scaled_dot_product_attention`
+    and agree up to float rounding. `attn_mask` may be any shape broadcastable to [batch, n_heads, q_len, k_len].
+    """
+    return _ATTENTION_FNS[backend](query, key, value, attn_mask=attn_mask, dropout_p=dropout_p, is_causal=is_causal,
+                                   scale=scale, training=training)
+
+
+def set_attention_backend(model, backend):
+    """Selects the attention backend of every attention layer in `model`, see `ATTENTION_BACKENDS`."""
+    if backend not in ATTENTION_BACKENDS:
+        raise ValueError(f"backend must be one of {ATTENTION_BACKENDS}, got {backend!r}.")
+    for module in model.modules():
+        if isinstance(module, (MultiHeadAttentionWithRoPE, MultiHeadCrossAttentionWithRoPE)):
+            module.attn_backend = backend
+    return model
+
+
+class KVCache:
+    """
+    Key/value cache of a single attention layer for incremental decoding.
+
+    Keys are stored after the rotary embedding has been applied. `start_pos` is the
+    absolute position of the first cached entry, so new positions are rotated with
+    the correct offset.
+
+    By default `update` concatenates; after `reserve` new positions are written in place into
+    preallocated buffers, and `k`/`v` are views of their filled part.
+    """
+
+    def __init__(self):
+        self.k = None
+        self.v = None
+        self.start_pos = 0
+        # Preallocated storage from `reserve`; `_offset` is the buffer index of k[:, :, 0]
+        self._k_buf = None
+        self._v_buf = None
+        self._offset = 0
+        self._static = False
+
+    def __len__(self):
+        return 0 if self.k is None else self.k.size(-2)
+
+    @property
+    def next_pos(self):
+        return self.start_pos + len(self)
+
+    def reserve(self, capacity, static=False):
+        """
+        Preallocates buffers for `capacity` positions (including the cached ones), so that `update` writes
+        in place instead of re-concatenating the whole cache. Buffer slots are only written once, so
+        views handed out earlier (`copy`, `to_dict`) stay valid. Past the capacity `update` falls back to
+        concatenation.
+
+        With `static`, `update` returns the whole buffers, so that every step sees the same shapes (e.g.
+        for torch.compile). The caller must then mask the unfilled slots `len(self):capacity` as padding,
+        and must not `evict`.
+        """
+        n = len(self)
+        shape = self.k.shape[:-2] + (max(capacity, n), self.k.size(-1))
+        self._k_buf, self._v_buf = self.k.new_zeros(shape), self.v.new_zeros(shape)
+        self._k_buf[:, :, :n] = self.k
+        self._v_buf[:, :, :n] = self.v
+        self.k, self.v = self._k_buf[:, :, :n], self._v_buf[:, :, :n]
+        self._offset = 0
+        self._static = static
+        return self
+
+    def update(self, k, v):
+        if self.k is None:
+            self.k, self.v = k, v
+        elif self._k_buf is not None and self._offset + len(self) + k.size(-2) <= self._k_buf.size(-2):
+            start = self._offset + len(self)
+            end = start + k.size(-2)
+            self._k_buf[:, :, start:end] = k
+            self._v_buf[:, :, start:end] = v
+            self.k, self.v = self._k_buf[:, :, self._offset:end], self._v_buf[:, :, self._offset:end]
+            if self._static:
+                return self._k_buf, self._v_buf
+        else:
+            self._k_buf = self._v_buf = None
+            self.k = torch.cat([self.k, k], dim=-2)
+            self.v = torch.cat([self.v, v], dim=-2)
+        return self.k, self.v
+
+    def evict(self, n):
+        """
+        Drops the `n` oldest positions. The remaining keys keep the rotation of their
+        absolute positions: RoPE attention scores only depend on relative offsets, so this
+        is equivalent to re-basing the window to start at position 0.
+        """
+        if n > 0 and self.k is not None:
+            self.k = self.k[:, :, n:]
+            self.v = self.v[:, :, n:]
+            self.start_pos += n
+            self._offset += n
+
+    def repeat_interleave(self, repeats):
+        """Fans every cached sequence out to `repeats` consecutive copies along the batch dimension."""
+        if self.k is not None:
+            self.k = self.k.repeat_interleave(repeats, dim=0)
+            self.v = self.v.repeat_interleave(repeats, dim=0)
+            self._k_buf = self._v_buf = None
+
+    def copy(self):
+        """
+        Returns an independent cache sharing the current tensors. `update` never overwrites positions that are
+        already cached, and the copy does not share the preallocated buffers.
+        """
+        cache = KVCache()
+        cache.k, cache.v, cache.start_pos = self.k, self.v, self.start_pos
+        return cache
+
+    def to_dict(self):
+        return {'k': self.k, 'v': self.v, 'start_pos': self.start_pos}
+
+    @classmethod
+    def from_dict(cls, state, device=None):
+        cache = cls()
+        cache.k, cache.v, cache.start_pos = state['k'], state['v'], state['start_pos']
+        if device is not None and cache.k is not None:
+            cache.k, cache.v = cache.k.to(device), cache.v.to(device)
+        return cache
+
+
 class MultiHeadAttentionWithRoPE(nn.Module):
     def __init__(self, d_model, n_heads, attn_dropout_p=0.0, resid_dropout_p=0.0):
         super().__init__()
@@ -346,32 +605,56 @@ class MultiHeadAttentionWithRoPE(nn.Module):
         self.q_proj = nn.Linear(d_model, d_model)
         self.k_proj = nn.Linear(d_model, d_model)
         self.v_proj = nn.Linear(d_model, d_model)
+        self.qkv_proj = None  # Fused q/k/v, see `fuse_projections`
         self.out_proj = nn.Linear(d_model, d_model)
         self.rotary = RotaryPositionalEmbedding(self.head_dim)
         self.attn_dropout_p = attn_dropout_p
+        self.attn_backend = "reference"
         self.resid_dropout = nn.Dropout(resid_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    @torch.no_grad()
+    def fuse_projections(self, scale=None):
+        """Replaces q_proj, k_proj and v_proj by a single `qkv_proj`; `scale` is folded into its input features."""
+        self.qkv_proj = fuse_linear([self.q_proj, self.k_proj, self.v_proj], scale)
+        self.q_proj = self.k_proj = self.v_proj = None
+
+    def forward(self, x, key_padding_mask=None, kv_cache=None):
+        """
+        x: [batch, seq_len, d_model]
+        key_padding_mask: [batch, key_len], covering cached and new positions when kv_cache is given
+        kv_cache: Optional KVCache; the new keys/values are appended and attention runs over all of them
+        """
         batch_size, seq_len, _ = x.shape
 
-        q = self.q_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
-        k = self.k_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
-        v = self.v_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+        if self.qkv_proj is not None:
+            qkv = self.qkv_proj(x).view(batch_size, seq_len, 3 * self.n_heads, self.head_dim).transpose(1, 2)
+            q, k, v = qkv.split(self.n_heads, dim=1)
+            if kv_cache is not None:
+                # Do not keep the whole fused projection alive (or serialized) through the cached values
+                v = v.contiguous()
+        else:
+            q = self.q_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+            k = self.k_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+            v = self.v_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
 
-        q, k = self.rotary(q, k)
+        if kv_cache is not None:
+            q, k = self.rotary(q, k, offset=kv_cache.next_pos)
+            k, v = kv_cache.update(k, v)
+        else:
+            q, k = self.rotary(q, k)
 
         if key_padding_mask is not None:
-            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)  # [batch, 1, 1, seq_len]
-            attn_mask = attn_mask.expand(-1, self.n_heads, seq_len, -1)  # [batch, n_heads, q_len, k_len]
+            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)  # [batch, 1, 1, k_len], broadcast over heads and queries
         else:
             attn_mask = None
 
-        attn_output = scaled_dot_product_attention(
+        attn_output = attention(
             q, k, v,
             attn_mask=attn_mask,
             dropout_p=self.attn_dropout_p,
             is_causal=True,
-            training=self.training
+            training=self.training,
+            backend=self.attn_backend
         )
 
         attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
@@ -388,40 +671,76 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
         self.q_proj = nn.Linear(d_model, d_model)
         self.k_proj = nn.Linear(d_model, d_model)
         self.v_proj = nn.Linear(d_model, d_model)
+        self.kv_proj = None  # Fused k/v, see `fuse_projections`
         self.out_proj = nn.Linear(d_model, d_model)
         self.rotary = RotaryPositionalEmbedding(self.head_dim)
         self.attn_dropout_p = attn_dropout_p
+        self.attn_backend = "reference"
         self.resid_dropout = nn.Dropout(resid_dropout)
 
-    def forward(self, query, key, value, key_padding_mask=None):
+    @torch.no_grad()
+    def fuse_projections(self):
+        """Replaces k_proj and v_proj by a single `kv_proj`, computed in one GEMM when keys and values are the same tensor."""
+        self.kv_proj = fuse_linear([self.k_proj, self.v_proj])
+        self.k_proj = self.v_proj = None
+
+    def forward(self, query, key, value, key_padding_mask=None, kv_cache=None):
+        """
+        kv_cache: Optional KVCache of projected keys/values. `key`/`value` then only hold the
+            positions not cached yet, and `query` must be a single row per sequence.
+        """
         batch_size, q_len, _ = query.shape
-        _, seq_len, _ = key.shape
 
         q = self.q_proj(query).view(batch_size, q_len, self.n_heads, self.head_dim).transpose(1, 2)
-        k = self.k_proj(key).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
-        v = self.v_proj(value).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
 
-        q, k = self.rotary(q, k)
+        if kv_cache is not None:
+            # A single query row is rotated at position 0 together with all keys, i.e. not at all,
+            # so the cache can hold unrotated projections.
+            assert q_len == 1, "Cached cross-attention expects a single query position"
+            k, v = self.cache_kv(key, value, kv_cache)
+        else:
+            k, v = self._project_kv(key, value)
+            q, k = self.rotary(q, k)
 
         if key_padding_mask is not None:
             attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)
-            attn_mask = attn_mask.expand(-1, self.n_heads, q_len, -1)
         else:
             attn_mask = None
 
         is_causal_flag = self.training
 
-        attn_output = scaled_dot_product_attention(
+        attn_output = attention(
             q, k, v,
             attn_mask=attn_mask,
             dropout_p=self.attn_dropout_p,
             is_causal=is_causal_flag,
-            training=self.training
+            training=self.training,
+            backend=self.attn_backend
         )
 
         attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, q_len, self.d_model)
         return self.resid_dropout(self.out_proj(attn_output))
 
+    def _project_kv(self, key, value):
+        batch_size, seq_len, _ = key.shape
+        if self.kv_proj is not None:
+            if key is value:
+                k, v = self.kv_proj(key).chunk(2, dim=-1)
+            else:
+                (w_k, w_v), (b_k, b_v) = self.kv_proj.weight.chunk(2), self.kv_proj.bias.chunk(2)
+                k, v = F.linear(key, w_k, b_k), F.linear(value, w_v, b_v)
+            k = k.view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+            v = v.view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+            return k, v
+        k = self.k_proj(key).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+        v = self.v_proj(value).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
+        return k, v
+
+    def cache_kv(self, key, value, kv_cache):
+        """Projects new key/value positions, appends them to `kv_cache` and returns all cached keys/values."""
+        k, v = self._project_kv(key, value)
+        return kv_cache.update(k, v)
+
 
 class HierarchicalEmbedding(nn.Module):
     def __init__(self, s1_bits, s2_bits, d_model=256):
@@ -440,6 +759,30 @@ class HierarchicalEmbedding(nn.Module):
         nn.init.normal_(self.emb_s1.weight, mean=0, std=d_model ** -0.5)
         nn.init.normal_(self.emb_s2.weight, mean=0, std=d_model ** -0.5)
 
+        # Projected lookup tables built by `fold`, only used in eval mode
+        self.register_buffer("folded_s1", None, persistent=False)
+        self.register_buffer("folded_s2", None, persistent=False)
+
+    @torch.no_grad()
+    def fold(self):
+        """
+        Folds `fusion_proj` into the embedding tables for inference.
+
+        The projection is linear, so `fusion_proj(cat(s1_emb, s2_emb))` equals a projected s1 table
+        (with the bias) plus a projected s2 table, and the forward pass becomes two lookups and an add.
+        The tables are dropped when switching to train mode; call `fold` again after changing the weights.
+        """
+        w_s1, w_s2 = self.fusion_proj.weight.split(self.d_model, dim=1)
+        scale = math.sqrt(self.d_model)
+        self.folded_s1 = (self.emb_s1.weight * scale) @ w_s1.T + self.fusion_proj.bias
+        self.folded_s2 = (self.emb_s2.weight * scale) @ w_s2.T
+        return self
+
+    def train(self, mode=True):
+        if mode:
+            self.folded_s1 = self.folded_s2 = None
+        return super().train(mode)
+
     def forward(self, token_ids):
         """Inputs:
         token_ids: [batch_size, seq_len] token ID
@@ -449,6 +792,8 @@ class HierarchicalEmbedding(nn.Module):
             s1_ids, s2_ids = token_ids
         else:
             s1_ids, s2_ids = self.split_token(token_ids, self.s2_bits)
+        if self.folded_s1 is not None and not self.training:
+            return F.embedding(s1_ids, self.folded_s1) + F.embedding(s2_ids, self.folded_s2)
         s1_emb = self.emb_s1(s1_ids) * math.sqrt(self.d_model)
         s2_emb = self.emb_s2(s2_ids) * math.sqrt(self.d_model)
         return self.fusion_proj(torch.cat([s1_emb, s2_emb], dim=-1))
@@ -460,16 +805,20 @@ class DependencyAwareLayer(nn.Module):
         self.cross_attn = MultiHeadCrossAttentionWithRoPE(d_model, n_heads, attn_dropout_p, resid_dropout)
         self.norm = RMSNorm(d_model)
 
-    def forward(self, hidden_states, sibling_embed, key_padding_mask=None):
+    def forward(self, hidden_states, sibling_embed, key_padding_mask=None, kv_cache=None):
         """hidden_states: [batch, seq_len, d_model]
         sibling_embed: Embedding from another subtoken
+        kv_cache: Optional KVCache of the cross-attention. Only the last position is computed.
         """
         attn_out = self.cross_attn(
             query=sibling_embed,
             key=hidden_states,
             value=hidden_states,
-            key_padding_mask=key_padding_mask
+            key_padding_mask=key_padding_mask,
+            kv_cache=kv_cache
         )
+        if kv_cache is not None:
+            hidden_states = hidden_states[:, -1:]
         return self.norm(hidden_states + attn_out)
 
 
@@ -481,10 +830,21 @@ class TransformerBlock(nn.Module):
         self.norm2 = RMSNorm(d_model)
         self.ffn = FeedForward(d_model, ff_dim, ffn_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    @torch.no_grad()
+    def optimize_for_inference(self):
+        """
+        Fuses the q/k/v and the w1/w3 projections and folds the RMSNorm weights into them.
+        The parameters no longer follow the checkpoint layout, so this is for inference only.
+        """
+        if self.norm1.weight is not None:
+            self.self_attn.fuse_projections(self.norm1.pop_weight())
+            self.ffn.fuse_projections(self.norm2.pop_weight())
+        return self
+
+    def forward(self, x, key_padding_mask=None, kv_cache=None):
         residual = x
         x = self.norm1(x)
-        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask)
+        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask, kv_cache=kv_cache)
         x = residual + attn_out
 
         residual = x
@@ -553,6 +913,7 @@ class TemporalEmbedding(nn.Module):
         weekday_size = 7
         day_size = 32
         month_size = 13
+        self.sizes = (minute_size, hour_size, weekday_size, day_size, month_size)
 
         Embed = FixedEmbedding if not learn_pe else nn.Embedding
         self.minute_embed = Embed(minute_size, d_model)
@@ -561,9 +922,43 @@ class TemporalEmbedding(nn.Module):
         self.day_embed = Embed(day_size, d_model)
         self.month_embed = Embed(month_size, d_model)
 
+        # Summed lookup tables built by `fold`, only used in eval mode
+        self.register_buffer("folded_clock", None, persistent=False)
+        self.register_buffer("folded_date", None, persistent=False)
+
+    @torch.no_grad()
+    def fold(self):
+        """
+        Precomputes the summed embeddings for inference, replacing the five lookups per position with two:
+        one into a (hour, minute) table of 24 * 60 rows and one into a (month, day, weekday) table of
+        13 * 32 * 7 rows. For daily data the first lookup always hits the same row.
+        Stamps must be within the embedding ranges, as produced by `calc_time_stamps`.
+        The tables are dropped when switching to train mode; call `fold` again after changing the weights.
+        """
+        device = next(self.parameters()).device
+        minute, hour, weekday, day, month = (
+            embed(torch.arange(size, device=device))
+            for embed, size in zip((self.minute_embed, self.hour_embed, self.weekday_embed, self.day_embed, self.month_embed),
+                                   self.sizes)
+        )
+        self.folded_clock = (hour[:, None] + minute[None, :]).flatten(0, 1)
+        self.folded_date = (month[:, None, None] + day[None, :, None] + weekday[None, None, :]).flatten(0, 2)
+        return self
+
+    def train(self, mode=True):
+        if mode:
+            self.folded_clock = self.folded_date = None
+        return super().train(mode)
+
     def forward(self, x):
         x = x.long()
 
+        if self.folded_clock is not None and not self.training:
+            minute_size, _, weekday_size, day_size, _ = self.sizes
+            clock = x[:, :, 1] * minute_size + x[:, :, 0]
+            date = (x[:, :, 4] * day_size + x[:, :, 3]) * weekday_size + x[:, :, 2]
+            return F.embedding(clock, self.folded_clock) + F.embedding(date, self.folded_date)
+
         minute_x = self.minute_embed(x[:, :, 0])
         hour_x = self.hour_embed(x[:, :, 1])
         weekday_x = self.weekday_embed(x[:, :, 2])
@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+# The profiler `stage` reports to, set while a Profiler is running
+_active = None
+_NULL_STAGE = nullcontext()
+
+
+def stage(name, tokens=0):
+    """
+    Times one stage of the forecast pipeline on the running `Profiler`.
+
+    When no profiler is running this returns a shared no-op context manager, so instrumented
+    code only pays for a function call and a global lookup.
+
+    Args:
+        name (str): Stage name, e.g. "tokenizer.encode" or "decode_s1".
+        tokens (int, optional): Number of tokens (rows x positions) the stage processes. Defaults to 0.
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name, tokens)
+
+
+def _read_peak_rss():
+    """Peak resident set size of the process in bytes since the last reset (Linux only), or None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class Profiler:
+    """
+    Collects wall time, call counts, processed tokens and peak memory per stage of the forecast pipeline.
+
+    Stages are opened with `stage` in model/kronos.py (normalization, tokenizer encode/decode, prefill,
+    every decode_s1/decode_s2 step, sampling) and src/predictor.py (DataFrame preparation, time features,
+    assembly). They nest, e.g. every decode step runs inside "generate", and a stage's time includes its children.
+
+    Peak memory is opt-in (`track_memory=True`) and only measured for top-level stages, e.g. "generate"
+    but not the decode steps inside it: the peak resident set size of the process, read from /proc on
+    Linux, and the peak allocated CUDA memory once CUDA is initialized. Measuring resets the process-wide
+    peaks (VmHWM and the CUDA allocator's peak stats) at the start of every top-level stage, which
+    disturbs any other peak-memory measurement running in the same process.
+    With `sync_cuda`, stages wait for queued CUDA kernels before they are timed.
+
+    Use it as a context manager, or call `start()` / `stop()` around a longer-running section:
+
+        with Profiler() as prof:
+            predictor.predict(df)
+        print(prof.table())
+        prof.to_json("profile.json")
+        prof.to_chrome_trace("trace.json")  # chrome://tracing or https://ui.perfetto.dev
+
+    Only one profiler runs at a time. Stages of all threads are recorded, but peak memory is process-wide.
+    """
+
+    def __init__(self, track_memory=False, sync_cuda=True):
+        self.track_memory = track_memory and _read_peak_rss() is not None
+        self.sync_cuda = sync_cuda
+        self.stats = {}
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = None
+
+    def start(self):
+        global _active
+        if _active is not None and _active is not self:
+            raise RuntimeError("Another Profiler is already running.")
+        if self._t0 is None:
+            self._t0 = time.perf_counter()
+        _active = self
+        return self
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _cuda(self):
+        return torch.cuda.is_available() and torch.cuda.is_initialized()
+
+    @contextmanager
+    def stage(self, name, tokens=0):
+        stack = self._local.__dict__.setdefault("stack", [])
+        measure = self.track_memory and not stack
+        if measure:
+            _reset_peak_rss()
+            if self._cuda():
+                torch.cuda.reset_peak_memory_stats()
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync_cuda and self._cuda():
+                torch.cuda.synchronize()
+            end = time.perf_counter()
+            stack.pop()
+            peak_rss = peak_cuda = None
+            if measure:
+                peak_rss = _read_peak_rss()
+                peak_cuda = torch.cuda.max_memory_allocated() if self._cuda() else None
+            self._record(name, start, end, tokens, peak_rss, peak_cuda, len(stack))
+
+    def _record(self, name, start, end, tokens, peak_rss, peak_cuda, depth):
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {"calls": 0, "seconds": 0.0, "tokens": 0, "peak_rss_bytes": None, "peak_cuda_bytes": None}
+            stats["calls"] += 1
+            stats["seconds"] += end - start
+            stats["tokens"] += int(tokens)
+            for key, peak in (("peak_rss_bytes", peak_rss), ("peak_cuda_bytes", peak_cuda)):
+                if peak is not None:
+                    stats[key] = peak if stats[key] is None else max(stats[key], peak)
+            self.events.append((name, start, end - start, int(tokens), peak_rss, peak_cuda, threading.get_ident(), depth))
+
+    def summary(self):
+        """
+        Returns:
+            dict: Per stage, in order of first completion: calls, total/mean milliseconds, tokens,
+                  tokens per second and peak memory in MB (None for nested stages or without `track_memory`).
+        """
+        summary = {}
+        with self._lock:
+            items = list(self.stats.items())
+        for name, stats in items:
+            seconds = stats["seconds"]
+            summary[name] = {
+                "calls": stats["calls"],
+                "total_ms": seconds * 1000,
+                "mean_ms": seconds * 1000 / stats["calls"],
+                "tokens": stats["tokens"],
+                "tokens_per_s": stats["tokens"] / seconds if stats["tokens"] and seconds > 0 else None,
+                "peak_rss_mb": None if stats["peak_rss_bytes"] is None else stats["peak_rss_bytes"] / 2 ** 20,
+                "peak_cuda_mb": None if stats["peak_cuda_bytes"] is None else stats["peak_cuda_bytes"] / 2 ** 20,
+            }
+        return summary
+
+    def table(self):
+        """Formats `summary()` as a plain-text table."""
+        lines = [f"{'stage':<20}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'tokens':>10}{'tok/s':>12}{'peak RSS MB':>13}"]
+        for name, row in self.summary().items():
+            tokens_per_s = "" if row["tokens_per_s"] is None else f"{row['tokens_per_s']:.0f}"
+            peak = "" if row["peak_rss_mb"] is None else f"{row['peak_rss_mb']:.0f}"
+            lines.append(f"{name:<20}{row['calls']:>8}{row['total_ms']:>12.2f}{row['mean_ms']:>10.3f}{row['tokens']:>10}"
+                         f"{tokens_per_s:>12}{peak:>13}")
+        return "\n".join(lines)
+
+    def to_json(self, path):
+        """Writes `summary()` to `path` as JSON."""
+        with open(path, "w") as f:
+            json.dump({"stages": self.summary()}, f, indent=2)
+
+    def to_chrome_trace(self, path):
+        """Writes every recorded stage as a complete event in the Chrome trace event format."""
+        pid = os.getpid()
+        t0 = self._t0 or 0.0
+        with self._lock:
+            events = list(self.events)
+        trace = []
+        for name, start, duration, tokens, peak_rss, peak_cuda, tid, depth in events:
+            args = {"tokens": tokens, "depth": depth}
+            if peak_rss is not None:
+                args["peak_rss_mb"] = round(peak_rss / 2 ** 20, 2)
+            if peak_cuda is not None:
+                args["peak_cuda_mb"] = round(peak_cuda / 2 ** 20, 2)
+            trace.append({"name": name, "cat": "kronos", "ph": "X", "ts": (start - t0) * 1e6, "dur": duration * 1e6,
+                          "pid": pid, "tid": tid, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
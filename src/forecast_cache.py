@@ -0,0 +1,174 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def make_key(*arrays, **params):
+    """
+    由输入窗口与预测参数计算缓存键（SHA-256 十六进制串）。
+
+    arrays 按 dtype、形状和内容参与哈希，params 按参数名排序后参与哈希，
+    因此相同的输入窗口和相同的模型/采样参数总是得到相同的键。
+    """
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.tobytes())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+class ForecastCache:
+    """
+    两级预测结果缓存：进程内 LRU + 可选的磁盘存储。
+
+    内存层最多保存 max_entries 个结果，按最近使用淘汰；磁盘层（设置 cache_dir 时启用）
+    每个结果存为一个 .npy 文件，总大小超过 max_disk_mb 时按最近访问时间淘汰最旧的文件。
+    磁盘命中的结果会回填到内存层。缓存的值为预测数组，get 返回副本，可被调用方修改。
+    线程安全，可在 ModelManager 的多个预测器实例之间共享。
+
+    磁盘层的文件列表与总大小只在创建时扫描一次目录，之后在内存中按访问顺序维护，写入不再遍历目录。
+    多个进程共用同一目录时，各自只统计自己写入或读到的文件，总大小上限按进程分别生效。
+    """
+
+    def __init__(self, max_entries: int = 1024, cache_dir: str = None, max_disk_mb: float = 256):
+        """
+        Args:
+            max_entries (int): 内存层最多保存的结果数
+            cache_dir (str): 磁盘缓存目录，默认不启用磁盘层
+            max_disk_mb (float): 磁盘层总大小上限（MB）
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries 必须大于等于 1。")
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # 磁盘层索引：键 -> 文件大小，按最近访问从旧到新排列
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        if cache_dir is not None:
+            self._scan_disk()
+
+    def __getstate__(self):
+        # 锁不能跨进程传递（spawn 方式的多进程分片），在子进程中重新创建
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """查询缓存，未命中时返回 None。"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return value.copy()
+
+            if self.cache_dir is not None:
+                path = self._path(key)
+                try:
+                    value = np.load(path)
+                    # 更新修改时间，重启后扫描目录时仍按最近访问排序
+                    os.utime(path)
+                    self._touch_disk(key, os.path.getsize(path))
+                except (OSError, ValueError):
+                    value = None
+                    self._drop_disk(key)
+                if value is not None:
+                    self._stats["disk_hits"] += 1
+                    self._put_memory(key, value)
+                    return value.copy()
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        """写入缓存（内存层与磁盘层）。"""
+        value = np.array(value, copy=True)
+        with self._lock:
+            self._put_memory(key, value)
+            if self.cache_dir is not None:
+                # 先写临时文件再改名，避免其他进程读到写了一半的文件
+                tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, value)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, self._path(key))
+                self._touch_disk(key, size)
+                self._evict_disk()
+
+    def _put_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _scan_disk(self):
+        """扫描磁盘缓存目录，按修改时间从旧到新建立索引。"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-len(".npy")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._touch_disk(key, size)
+
+    def _touch_disk(self, key, size):
+        self._drop_disk(key)
+        self._disk[key] = size
+        self._disk_bytes += size
+
+    def _drop_disk(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+
+    def _evict_disk(self):
+        # 总大小超过上限时才删除文件，按最近访问从旧到新淘汰
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空内存层与磁盘层，并重置统计。"""
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir is not None:
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(".npy"):
+                        os.remove(os.path.join(self.cache_dir, name))
+                self._disk.clear()
+                self._disk_bytes = 0
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self):
+        """返回命中/未命中统计及命中率。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
@@ -0,0 +1,103 @@
+import os
+import sys
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.predictor import CS2SkinPredictor
+from src.forecast_cache import ForecastCache
+
+DEFAULT_MODEL = "NeoQuasar/Kronos-small"
+DEFAULT_TOKENIZER = "NeoQuasar/Kronos-Tokenizer-base"
+
+
+def _warmup_history(days=64, seed=0):
+    """生成用于预热的随机游走价格序列"""
+    rng = np.random.default_rng(seed)
+    close = 10.0 * np.cumprod(1 + rng.normal(0, 0.02, days))
+    return pd.DataFrame({
+        "timestamps": pd.date_range("2024-01-01", periods=days, freq="D"),
+        "open": close,
+        "high": close,
+        "low": close,
+        "close": close,
+    })
+
+
+class ModelManager:
+    """
+    进程级模型管理器。
+
+    每个 (model, tokenizer, device) 组合只加载一次，常驻内存并在请求之间复用，
+    避免每次请求都重新 from_pretrained 并迁移到设备。每个组合维护 pool_size 个预测器实例，
+    请求通过 acquire() 独占一个实例，用完归还；pool_size=1 时相当于加锁串行推理。
+    注意：每个实例各自持有一份权重，pool_size 越大内存占用越高。
+    传入 cache 时，所有实例共享同一个 ForecastCache；max_horizon、quantize、dtype 见 CS2SkinPredictor。
+    """
+
+    def __init__(self, pool_size=1, cache=None, max_horizon=None, quantize=None, dtype="float32"):
+        if pool_size < 1:
+            raise ValueError("pool_size 必须大于等于 1。")
+        if max_horizon is not None and cache is None:
+            # 预测天数复用依赖缓存保存轨迹，池内实例共享同一个缓存
+            cache = ForecastCache()
+        self.pool_size = pool_size
+        self.cache = cache
+        self.max_horizon = max_horizon
+        self.quantize = quantize
+        self.dtype = dtype
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self, model_name, tokenizer_name, device):
+        key = (model_name, tokenizer_name, device)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = queue.Queue()
+                for _ in range(self.pool_size):
+                    pool.put(CS2SkinPredictor(model_name=model_name, tokenizer_name=tokenizer_name, device=device, cache=self.cache,
+                                              max_horizon=self.max_horizon, quantize=self.quantize, dtype=self.dtype))
+                self._pools[key] = pool
+        return pool
+
+    @contextmanager
+    def acquire(self, model_name=DEFAULT_MODEL, tokenizer_name=DEFAULT_TOKENIZER, device=None):
+        """
+        借出一个常驻的 CS2SkinPredictor，首次调用时加载模型。
+
+        Args:
+            model_name (str): Hugging Face 上的 Kronos 模型名称
+            tokenizer_name (str): 对应的 Tokenizer 名称
+            device (str): 运行设备，默认自动选择
+
+        Yields:
+            CS2SkinPredictor: 在 with 块内独占使用的预测器
+        """
+        pool = self._get_pool(model_name, tokenizer_name, device)
+        predictor = pool.get()
+        try:
+            yield predictor
+        finally:
+            pool.put(predictor)
+
+    def warmup(self, model_name=DEFAULT_MODEL, tokenizer_name=DEFAULT_TOKENIZER, device=None):
+        """加载模型并对池中每个实例运行一次小规模预测，使首个真实请求只需推理时间。"""
+        pool = self._get_pool(model_name, tokenizer_name, device)
+        df = _warmup_history()
+        predictors = [pool.get() for _ in range(self.pool_size)]
+        try:
+            for predictor in predictors:
+                # 预热必须真正跑一次推理，跳过结果缓存
+                predictor.cache = None
+                predictor.predict(df, pred_days=1)
+        finally:
+            for predictor in predictors:
+                predictor.cache = self.cache
+                pool.put(predictor)
+        print(f"🔥 模型已预热: {model_name} ({self.pool_size} 个实例)")
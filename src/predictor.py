@@ -1,43 +1,115 @@
 import os
 import sys
+import numpy as np
 import torch
+import torch.multiprocessing as mp
 import pandas as pd
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from model import Kronos, KronosTokenizer, KronosPredictor
+from model.kronos import calc_time_stamps, derive_seed
+from model.profiler import stage
+from src.forecast_cache import ForecastCache, make_key
+
+# 每个皮肤最多使用的历史长度（天）
+HISTORY_LEN = 400
+
+# 多进程分片时，每个工作进程持有的预测器（fork 时直接继承父进程的模型权重）
+_worker_predictor = None
+
+
+def _init_shard_worker(predictor, num_threads):
+    global _worker_predictor
+    torch.set_num_threads(num_threads)
+    # 缓存的查找与写回由主进程完成，工作进程里的副本在退出时丢失，不再使用
+    predictor.cache = None
+    _worker_predictor = predictor
+
+
+def _predict_shard(shard_df, skin_id_col, kwargs):
+    try:
+        return _worker_predictor.predict_batch(shard_df, skin_id_col=skin_id_col, num_workers=1, **kwargs)
+    except RuntimeError as e:
+        print(f"⚠️ 分片预测失败: {e}")
+        return None
 
 
 class CS2SkinPredictor:
     """
     封装 Kronos 模型，用于 CS2 皮肤价格预测。
-    支持单序列预测和批量预测（通过循环）。
+    支持单序列预测和批量预测（按块批量送入模型）。
     """
 
-    def __init__(self, model_name="NeoQuasar/Kronos-small", tokenizer_name="NeoQuasar/Kronos-Tokenizer-base"):
+    def __init__(self, model_name="NeoQuasar/Kronos-small", tokenizer_name="NeoQuasar/Kronos-Tokenizer-base", device=None,
+                 cache: ForecastCache = None, max_horizon: int = None, quantize: str = None, dtype: str = "float32",
+                 model: Kronos = None, tokenizer: KronosTokenizer = None, max_context: int = 512):
         """
         初始化预测器。
         
         Args:
             model_name (str): Hugging Face 上的 Kronos 模型名称
             tokenizer_name (str): 对应的 Tokenizer 名称
+            device (str): 运行设备，默认自动选择
+            cache (ForecastCache): 预测结果缓存，默认不缓存。命中时直接返回结果，不再推理
+            max_horizon (int): 预测天数复用模式。设置后每个序列总是生成 max_horizon 天并存入缓存，
+                               任意 pred_days <= max_horizon 的请求都从这条轨迹截取，切换预测天数不再重新推理。
+                               未指定 cache 时自动使用内存缓存。上限为 max_context - HISTORY_LEN（Kronos-small / base 为 112）
+            quantize (str): 量化模式，"int8" 对模型和 Tokenizer 的线性层做动态 int8 量化（仅 CPU，未指定 device 时使用 CPU），
+                            精度与速度对比见 benchmarks/quantization_report.py。默认使用 fp32。
+                            动态量化的激活缩放按整个输入张量计算，同批其他序列会影响结果，因此 int8 模式下逐个序列推理，
+                            结果与批次组成、分片和缓存来源无关，但无法从批量推理中获得加速
+            dtype (str): 推理精度，"float32" / "bfloat16" / "float16"（需设备支持，不能与 quantize 同时使用）。
+                         低精度下权重和激活减半，softmax、归一化统计量与采样仍用 fp32，反归一化始终在 fp32 下进行
+                         低精度下结果与批次组成有关：同一皮肤、同一种子在不同批次（分片、分块、缓存未命中的组合）中预测的收盘价
+                         可相差几个百分点（最大约 5%，见 benchmarks/inference_suite.py --dtype bfloat16），需要可复现结果时使用 float32
+            model (Kronos): 已加载的模型实例，传入时不再从 Hugging Face 加载 model_name（例如本地微调或测试用的小模型）
+            tokenizer (KronosTokenizer): 已加载的 Tokenizer 实例，同上。两者会被原地优化为推理专用（见 optimize_for_inference）。
+                                         model_name / tokenizer_name 仍作为缓存键和状态的模型标识，应能区分不同的权重
+            max_context (int): 模型的最大上下文长度，Kronos-small / base 为 512
         """
-        self.device = self._get_device()
+        self.model_name = model_name
+        self.tokenizer_name = tokenizer_name
+        if max_horizon is not None and cache is None:
+            cache = ForecastCache()
+        self.max_horizon = max_horizon
+        self.cache = cache
+        self.quantize = quantize
+        self.dtype = dtype
+        self.device = device or ("cpu" if quantize else self._get_device())
         print(f"✅ 使用设备: {self.device}")
 
-        print(f"📥 加载 Tokenizer: {tokenizer_name}")
-        self.tokenizer = KronosTokenizer.from_pretrained(tokenizer_name)
+        if tokenizer is None:
+            print(f"📥 加载 Tokenizer: {tokenizer_name}")
+            tokenizer = KronosTokenizer.from_pretrained(tokenizer_name)
+        self.tokenizer = tokenizer
 
-        print(f"📥 加载模型: {model_name}")
-        self.model = Kronos.from_pretrained(model_name)
+        if model is None:
+            print(f"📥 加载模型: {model_name}")
+            model = Kronos.from_pretrained(model_name)
+        self.model = model
+
+        # 仅用于推理：合并 QKV / FFN 投影并折叠 RMSNorm 权重，输出只有浮点舍入级别的差异
+        self.tokenizer.optimize_for_inference()
+        self.model.optimize_for_inference()
 
-        # Kronos-small / base 的 max_context 为 512
         self.predictor = KronosPredictor(
             model=self.model,
             tokenizer=self.tokenizer,
             device=self.device,
-            max_context=512
+            max_context=max_context,
+            quantize=quantize,
+            dtype=dtype
         )
+        self._check_max_horizon(max_horizon)
+
+    def _check_max_horizon(self, max_horizon):
+        """tokenizer 解码是因果的，只要解码窗口不滑动（历史 + 预测不超过 max_context），截取前缀与单独生成较短序列一致"""
+        if max_horizon is None:
+            return
+        limit = self.predictor.max_context - HISTORY_LEN
+        if not 1 <= max_horizon <= limit:
+            raise ValueError(f"max_horizon 必须在 1 到 {limit} 之间（max_context={self.predictor.max_context}，历史长度 {HISTORY_LEN}）。")
 
     def _get_device(self):
         """自动选择可用设备"""
@@ -48,7 +120,7 @@ class CS2SkinPredictor:
         else:
             return "cpu"
 
-    def predict(self, df: pd.DataFrame, pred_days: int = 7, T: float = 0.8, top_p: float = 0.9):
+    def predict(self, df: pd.DataFrame, pred_days: int = 7, T: float = 0.8, top_p: float = 0.9, seed: int = None, skin_id=None):
         """
         对单个皮肤价格进行预测。
         
@@ -57,82 +129,265 @@ class CS2SkinPredictor:
             pred_days (int): 预测未来天数（1–14）
             T (float): 采样温度
             top_p (float): 核采样概率
+            seed (int): 采样种子。设置后结果可复现，且与同一 skin_id 在 predict_batch 中采样的 token 相同，预测值仅有浮点舍入级别的差异
+            skin_id: 皮肤 ID，与 seed 一起派生该皮肤的采样种子
             
         Returns:
             pd.DataFrame: 预测结果，索引为未来日期，包含 OHLC(VA)
         """
+        return self.predict_many([df], pred_days=pred_days, T=T, top_p=top_p, seed=seed, skin_ids=[skin_id])[0]
+
+    def _prepare_inputs(self, df: pd.DataFrame):
+        """校验单个皮肤的历史数据，返回 (x, 时间戳)，缺失的 volume/amount 以 0 填充。时间特征在未命中缓存时才计算。"""
         required_cols = ["timestamps", "open", "high", "low", "close"]
         if not all(col in df.columns for col in required_cols):
             raise ValueError(f"输入数据必须包含列: {required_cols}")
 
-        df = df.copy()
-        df["timestamps"] = pd.to_datetime(df["timestamps"])
-
         available_cols = ["open", "high", "low", "close"]
         if "volume" in df.columns and "amount" in df.columns:
             available_cols += ["volume", "amount"]
         elif "volume" in df.columns or "amount" in df.columns:
             print("仅提供 volume 或 amount 中的一个，将忽略该字段。")
 
-        x_df = df[available_cols].iloc[-400:]
-        x_timestamp = df["timestamps"].iloc[-400:]
+        timestamps = pd.to_datetime(df["timestamps"].iloc[-HISTORY_LEN:]).reset_index(drop=True)
+        x = np.zeros((len(timestamps), 6), dtype=np.float32)
+        x[:, :len(available_cols)] = df[available_cols].iloc[-HISTORY_LEN:].to_numpy(dtype=np.float32)
+        if np.isnan(x).any():
+            raise ValueError("价格或成交量列包含 NaN")
+        return x, timestamps
+
+    def _cache_key(self, x, last_timestamp, pred_days, T, top_p, seed, skin_id):
+        """预测结果的缓存键：输入窗口内容 + 模型标识 + 采样参数（skin_id 仅在设置 seed 时影响结果）"""
+        return make_key(x, model=self.model_name, tokenizer=self.tokenizer_name, quantize=self.quantize, dtype=self.dtype, last_timestamp=str(last_timestamp),
+                        pred_days=int(pred_days), T=float(T), top_p=float(top_p), top_k=0, sample_count=1,
+                        seed=seed, skin_id=None if seed is None else str(skin_id))
+
+    def _generated_days(self, pred_days):
+        """实际生成的天数：预测天数复用模式下为 max_horizon，否则为 pred_days"""
+        if self.max_horizon is None:
+            return pred_days
+        if pred_days > self.max_horizon:
+            raise ValueError(f"pred_days={pred_days} 超过 max_horizon={self.max_horizon}。")
+        return self.max_horizon
 
-        y_timestamp = pd.Series(
-            pd.date_range(
-                start=x_timestamp.iloc[-1] + pd.Timedelta(days=1),
-                periods=pred_days,
-                freq="D"
+    def predict_many(self, dfs, pred_days=7, T=0.8, top_p=0.9, seed=None, skin_ids=None):
+        """
+        将多个独立的预测请求合并为一次批量推理。
+
+        与 predict_batch 不同，每个请求可以有自己的预测天数和采样参数：模型按最长的 pred_days 生成，
+        再按各自的天数截取（自回归生成与解码都是因果的，截取前缀与单独生成较短序列等价）。
+        设置了 cache 时，命中缓存的请求不参与推理。
+
+        Args:
+            dfs (List[pd.DataFrame]): 每个请求的历史数据，格式同 predict
+            pred_days (int 或 List[int]): 预测天数，可逐请求指定
+            T, top_p (float 或 List[float]): 采样参数，可逐请求指定
+            seed (int 或 List[int]): 采样种子，见 predict，可逐请求指定；列表中为 None 的请求使用随机种子
+            skin_ids (list): 每个请求的皮肤 ID，与 seed 一起派生采样种子，默认均为 None
+
+        Returns:
+            List[pd.DataFrame]: 与 dfs 顺序一致的预测结果，格式同 predict
+        """
+        n = len(dfs)
+        pred_days, T, top_p = (list(p) if np.ndim(p) else [p] * n for p in (pred_days, T, top_p))
+        seeds = list(seed) if np.ndim(seed) else [seed] * n
+        skin_ids = [None] * n if skin_ids is None else list(skin_ids)
+        gen_days = [self._generated_days(days) for days in pred_days]
+
+        with stage("prepare"):
+            inputs = [self._prepare_inputs(df) for df in dfs]
+        preds = [None] * n
+        keys = [None] * n
+        if self.cache is not None:
+            for i, (x, timestamps) in enumerate(inputs):
+                keys[i] = self._cache_key(x, timestamps.iloc[-1], gen_days[i], T[i], top_p[i], seeds[i], skin_ids[i])
+                preds[i] = self.cache.get(keys[i])
+
+        todo = [i for i in range(n) if preds[i] is None]
+        if todo:
+            max_days = max(gen_days[i] for i in todo)
+            with stage("calc_time_stamps"):
+                x_stamps = [calc_time_stamps(inputs[i][1]).values.astype(np.float32) for i in todo]
+                y_stamps = []
+                for i in todo:
+                    y_timestamp = pd.date_range(start=inputs[i][1].iloc[-1] + pd.Timedelta(days=1), periods=max_days, freq="D")
+                    y_stamps.append(calc_time_stamps(pd.Series(y_timestamp)).values.astype(np.float32))
+            seed_list = None
+            if any(seeds[i] is not None for i in todo):
+                # 未指定种子的请求使用随机种子，保持随机采样
+                seed_list = [derive_seed(seeds[i], skin_ids[i]) if seeds[i] is not None else int(torch.randint(2 ** 62, ()))
+                             for i in todo]
+            todo_preds = self.predictor.predict_arrays(
+                [inputs[i][0] for i in todo], x_stamps, y_stamps,
+                pred_len=max_days, T=[T[i] for i in todo], top_p=[top_p[i] for i in todo], sample_count=1, verbose=False,
+                seed=seed_list
             )
-        )
+            for i, pred in zip(todo, todo_preds):
+                preds[i] = pred[:gen_days[i]]
+                if self.cache is not None:
+                    self.cache.put(keys[i], preds[i])
 
-        pred_df = self.predictor.predict(
-            df=x_df,
-            x_timestamp=x_timestamp,
-            y_timestamp=y_timestamp,
-            pred_len=pred_days,
-            T=T,
-            top_p=top_p,
-            sample_count=1,
-            verbose=False
-        )
-        pred_df.index = y_timestamp
-        return pred_df
+        out_cols = ["open", "high", "low", "close", "volume", "amount"]
+        with stage("assemble"):
+            return [pd.DataFrame(pred[:days], columns=out_cols,
+                                 index=pd.date_range(start=timestamps.iloc[-1] + pd.Timedelta(days=1), periods=days, freq="D"))
+                    for pred, days, (_, timestamps) in zip(preds, pred_days, inputs)]
 
-    def predict_batch(self, df_long: pd.DataFrame, skin_id_col: str = "skin_id", pred_days: int = 7, T: float = 0.8, top_p: float = 0.9):
+    def predict_batch(self, df_long: pd.DataFrame, skin_id_col: str = "skin_id", pred_days: int = 7, T: float = 0.8, top_p: float = 0.9,
+                      batch_size: int = 64, max_memory_mb: float = None, num_workers: int = 1, seed: int = None):
         """
         批量预测多个皮肤。
-        
+
+        一次 groupby 构建所有皮肤的输入数组，按历史长度排序后分块调用 KronosPredictor.predict_arrays，
+        以限制内存占用和 padding 浪费。单个皮肤的数据问题只会跳过该皮肤；若某一块在模型推理时出错，
+        则对该块逐个皮肤重试，保证失败隔离。
+
         Args:
             df_long (pd.DataFrame): 长格式数据，必须包含 skin_id_col 和 OHLC 列
             skin_id_col (str): 皮肤 ID 列名
-            pred_days (int): 预测天数
+            pred_days (int): 预测天数（预测天数复用模式下生成 max_horizon 天再截取）
             T, top_p: 采样参数
-            
+            batch_size (int): 每次送入模型的皮肤数量
+            max_memory_mb (float): 内存预算（MB）。设置后由 plan_batches 估算峰值内存，在每块内部再切分子批次
+            num_workers (int): 工作进程数（仅 CPU）。大于 1 时先在主进程查找缓存，只把未命中的皮肤按 ID 分片到多个进程，结果写回缓存，见 _predict_sharded
+            seed (int): 采样种子。每个皮肤的种子由 (skin_id, seed) 派生，采样的 token 与批次组成、分块和进程数无关，
+                        padding 只带来浮点舍入级别的差异（float32 下约 1e-6），并非逐位相同
+
         Returns:
             pd.DataFrame: 包含所有皮肤预测结果，新增 'skin_id' 列
         """
         if skin_id_col not in df_long.columns:
             raise ValueError(f"批量预测需要 '{skin_id_col}' 列标识不同皮肤。")
+        required_cols = ["timestamps", "open", "high", "low", "close"]
+        if not all(col in df_long.columns for col in required_cols):
+            raise ValueError(f"输入数据必须包含列: {required_cols}")
+
+        if num_workers > 1 and self.device != "cpu":
+            print(f"多进程分片仅支持 CPU，当前设备为 {self.device}，改为单进程预测。")
+            num_workers = 1
+
+        price_cols = ["open", "high", "low", "close"]
+        out_cols = price_cols + ["volume", "amount"]
+        available_cols = list(price_cols)
+        if "volume" in df_long.columns and "amount" in df_long.columns:
+            available_cols += ["volume", "amount"]
+        elif "volume" in df_long.columns or "amount" in df_long.columns:
+            print("仅提供 volume 或 amount 中的一个，将忽略该字段。")
+
+        # 一次性完成时间特征与数值转换，之后按行号切片
+        with stage("prepare"):
+            timestamps = pd.to_datetime(df_long["timestamps"]).reset_index(drop=True)
+            with stage("calc_time_stamps"):
+                stamps = calc_time_stamps(timestamps).values.astype(np.float32)
+            values = np.zeros((len(df_long), len(out_cols)), dtype=np.float32)
+            values[:, :len(available_cols)] = df_long[available_cols].to_numpy(dtype=np.float32)
+            row_groups = df_long.groupby(skin_id_col, sort=False).indices
 
-        all_preds = []
         skin_ids = df_long[skin_id_col].unique()
+        gen_days = self._generated_days(pred_days)
         print(f"🔄 开始批量预测 {len(skin_ids)} 个皮肤...")
 
-        for i, skin_id in enumerate(skin_ids):
-            skin_df = df_long[df_long[skin_id_col] == skin_id].copy()
+        inputs = {}
+        preds = {}
+        keys = {}
+        with stage("prepare"):
+            for skin_id in skin_ids:
+                rows = row_groups[skin_id][-HISTORY_LEN:]
+                x = values[rows]
+                if np.isnan(x).any():
+                    print(f"⚠️ 皮肤 {skin_id} 预测失败: 价格或成交量列包含 NaN")
+                    continue
+                y_timestamp = pd.date_range(start=timestamps.iloc[rows[-1]] + pd.Timedelta(days=1), periods=gen_days, freq="D")
+                inputs[skin_id] = (x, stamps[rows], y_timestamp)
+                if self.cache is not None:
+                    keys[skin_id] = self._cache_key(x, timestamps.iloc[rows[-1]], gen_days, T, top_p, seed, skin_id)
+                    cached = self.cache.get(keys[skin_id])
+                    if cached is not None:
+                        preds[skin_id] = cached
+        if preds:
+            print(f"   缓存命中 {len(preds)} 个皮肤")
+
+        # 按历史长度排序后分块，相近长度的皮肤在同一块中，减少 padding
+        ordered = sorted((k for k in inputs if k not in preds), key=lambda k: len(inputs[k][0]))
+        n_cached = len(preds)
+        if num_workers > 1 and ordered:
+            # 只把未命中缓存的皮肤分给工作进程，返回的完整轨迹（gen_days 天）写回主进程的缓存
+            for part in self._predict_sharded(df_long[df_long[skin_id_col].isin(ordered)], skin_id_col, num_workers, pred_days=gen_days,
+                                              T=T, top_p=top_p, batch_size=batch_size, max_memory_mb=max_memory_mb, seed=seed):
+                for skin_id, group in part.groupby(skin_id_col, sort=False):
+                    preds[skin_id] = group[out_cols].to_numpy(dtype=np.float32)
+                    if self.cache is not None:
+                        self.cache.put(keys[skin_id], preds[skin_id])
+            ordered = []
+        seeds = None if seed is None else {skin_id: derive_seed(seed, skin_id) for skin_id in inputs}
+        y_stamp_cache = {}
+        for start in range(0, len(ordered), batch_size):
+            chunk = ordered[start:start + batch_size]
+            y_stamps = []
+            with stage("calc_time_stamps"):
+                for skin_id in chunk:
+                    y_timestamp = inputs[skin_id][2]
+                    if y_timestamp[0] not in y_stamp_cache:
+                        y_stamp_cache[y_timestamp[0]] = calc_time_stamps(pd.Series(y_timestamp)).values.astype(np.float32)
+                    y_stamps.append(y_stamp_cache[y_timestamp[0]])
             try:
-                pred = self.predict(skin_df, pred_days=pred_days, T=T, top_p=top_p)
-                pred[skin_id_col] = skin_id
-                all_preds.append(pred)
-                if (i + 1) % 50 == 0:
-                    print(f"   已完成 {i + 1}/{len(skin_ids)} 个皮肤")
+                chunk_preds = self.predictor.predict_arrays(
+                    [inputs[k][0] for k in chunk], [inputs[k][1] for k in chunk], y_stamps,
+                    pred_len=gen_days, T=T, top_p=top_p, sample_count=1, verbose=False, max_memory_mb=max_memory_mb,
+                    seed=None if seeds is None else [seeds[k] for k in chunk]
+                )
+                preds.update(zip(chunk, chunk_preds))
+                if self.cache is not None:
+                    for skin_id, pred in zip(chunk, chunk_preds):
+                        self.cache.put(keys[skin_id], pred)
             except Exception as e:
-                print(f"⚠️ 皮肤 {skin_id} 预测失败: {e}")
-                continue
+                print(f"⚠️ 批次预测失败，逐个重试: {e}")
+                for skin_id, y_stamp in zip(chunk, y_stamps):
+                    try:
+                        preds[skin_id] = self.predictor.predict_arrays(
+                            [inputs[skin_id][0]], [inputs[skin_id][1]], [y_stamp],
+                            pred_len=gen_days, T=T, top_p=top_p, sample_count=1, verbose=False, max_memory_mb=max_memory_mb,
+                            seed=None if seeds is None else seeds[skin_id]
+                        )[0]
+                        if self.cache is not None:
+                            self.cache.put(keys[skin_id], preds[skin_id])
+                    except Exception as e:
+                        print(f"⚠️ 皮肤 {skin_id} 预测失败: {e}")
+            print(f"   已完成 {n_cached + min(start + batch_size, len(ordered))}/{len(skin_ids)} 个皮肤")
 
-        if not all_preds:
+        if not preds:
             raise RuntimeError("所有皮肤预测均失败。")
 
-        result = pd.concat(all_preds, ignore_index=False)
-        result = result.reset_index().rename(columns={"index": "timestamps"})
-        return result
\ No newline at end of file
+        # 按原始皮肤顺序拼接结果
+        with stage("assemble"):
+            done = [skin_id for skin_id in skin_ids if skin_id in preds]
+            result = pd.DataFrame(np.concatenate([preds[k][:pred_days] for k in done]), columns=out_cols)
+            result.insert(0, "timestamps", np.concatenate([inputs[k][2][:pred_days] for k in done]))
+            result[skin_id_col] = np.repeat(done, pred_days)
+        return result
+
+    def _predict_sharded(self, df_long: pd.DataFrame, skin_id_col: str, num_workers: int, **kwargs):
+        """
+        多进程 CPU 分片预测。
+
+        皮肤 ID 按出现顺序切成 num_workers 个连续分片，每个进程设置 torch 线程数为 CPU 核数 / num_workers。
+        模型权重先移到共享内存，工作进程只读共享而不重复加载。工作进程不使用缓存。
+
+        Returns:
+            List[pd.DataFrame]: 按分片顺序排列的各分片结果，失败的分片被跳过
+        """
+        skin_ids = df_long[skin_id_col].unique()
+        shards = [shard for shard in np.array_split(skin_ids, num_workers) if len(shard)]
+        shard_of = {skin_id: i for i, shard in enumerate(shards) for skin_id in shard}
+        parts = dict(tuple(df_long.groupby(df_long[skin_id_col].map(shard_of), sort=True)))
+
+        num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+        self.model.share_memory()
+        self.tokenizer.share_memory()
+
+        print(f"🔄 使用 {len(shards)} 个进程（每进程 {num_threads} 线程）分片预测 {len(skin_ids)} 个皮肤...")
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        with ctx.Pool(len(shards), initializer=_init_shard_worker, initargs=(self, num_threads)) as pool:
+            results = pool.starmap(_predict_shard, [(parts[i], skin_id_col, kwargs) for i in sorted(parts)])
+
+        return [r for r in results if r is not None]
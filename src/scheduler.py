@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.model_manager import ModelManager
+
+# 关闭调度器时放入队列的哨兵
+_STOP = object()
+
+
+class MicroBatchScheduler:
+    """
+    微批调度器：把短时间窗口内到达的并发预测请求合并为一次批量推理。
+
+    后台线程取到第一个请求后，最多再等待 max_wait_ms 毫秒或凑满 max_batch_size 个请求，
+    然后借出一个常驻预测器调用 CS2SkinPredictor.predict_many，并把结果分别交回各自的调用方。
+    同一批内的请求可以有不同的 pred_days、T、top_p 和 seed。若整批推理出错，则逐个请求重试，
+    错误只会出现在对应请求的 Future 上。
+    """
+
+    def __init__(self, model_manager: ModelManager = None, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        """
+        Args:
+            model_manager (ModelManager): 提供常驻预测器的模型管理器，默认新建一个
+            max_batch_size (int): 每批最多合并的请求数
+            max_wait_ms (float): 收到第一个请求后最多等待的毫秒数
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size 必须大于等于 1。")
+        self.model_manager = model_manager or ModelManager()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, df, pred_days: int = 7, T: float = 0.8, top_p: float = 0.9, seed: int = None, skin_id=None) -> Future:
+        """
+        提交一个预测请求，立即返回 Future，其结果格式同 CS2SkinPredictor.predict。
+        设置 seed 时结果与同批次的其他请求无关，与 predict(seed=seed, skin_id=skin_id) 一致。
+        """
+        if self._closed:
+            raise RuntimeError("调度器已关闭。")
+        future = Future()
+        self._queue.put((df, pred_days, T, top_p, seed, skin_id, future))
+        return future
+
+    def predict(self, df, pred_days: int = 7, T: float = 0.8, top_p: float = 0.9, seed: int = None, skin_id=None,
+                timeout: float = None):
+        """阻塞版本的 submit，直接返回预测结果。"""
+        return self.submit(df, pred_days=pred_days, T=T, top_p=top_p, seed=seed, skin_id=skin_id).result(timeout=timeout)
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程。"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self):
+        """阻塞等待第一个请求，再在时间窗口内尽量凑满一批。"""
+        batch = [self._queue.get()]
+        if batch[0] is _STOP:
+            return [], True
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            # 跳过调用方已取消的请求
+            batch = [item for item in batch if item[-1].set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        dfs, pred_days, T, top_p, seeds, skin_ids, futures = (list(col) for col in zip(*batch))
+        seeds = None if all(seed is None for seed in seeds) else seeds
+        try:
+            with self.model_manager.acquire() as predictor:
+                try:
+                    results = predictor.predict_many(dfs, pred_days=pred_days, T=T, top_p=top_p, seed=seeds, skin_ids=skin_ids)
+                except Exception as e:
+                    if len(batch) == 1:
+                        futures[0].set_exception(e)
+                        return
+                    print(f"⚠️ 批次预测失败，逐个重试: {e}")
+                    for df, days, t, p, seed, skin_id, future in batch:
+                        try:
+                            future.set_result(predictor.predict_many([df], pred_days=days, T=t, top_p=p, seed=seed, skin_ids=[skin_id])[0])
+                        except Exception as e:
+                            future.set_exception(e)
+                    return
+        except Exception as e:
+            # 模型加载失败等，整批失败
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
@@ -0,0 +1,164 @@
+import os
+import sys
+import hashlib
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.kronos import SeriesState, calc_time_stamps, derive_seed
+from src.predictor import CS2SkinPredictor, HISTORY_LEN
+
+
+class SkinStateStore:
+    """
+    按皮肤保存增量推理状态，用于每日追加一根日线的场景。
+
+    状态包含最近 HISTORY_LEN 天的原始数据、建立状态时的归一化统计量、历史 token，
+    以及 tokenizer 编码器/解码器和模型各层的 KV 缓存（见 KronosPredictor.init_state）。
+    新增一行只需一次编码器步、一次 Transformer 步和一次解码器步，而不是对整个窗口重新 prefill。
+
+    归一化统计量在建立状态时固定。当窗口的均值或标准差相对固定值的变化超过 rebase_tol 倍标准差，
+    或一次新增的行数超过 max_append、或数据不是简单追加（例如历史被修改）时，重新完整构建状态。
+    窗口超过 HISTORY_LEN 后最旧的位置从缓存中淘汰（与 window_mode='approx' 相同的近似）。
+
+    设置 state_dir 时状态以 torch.save 存盘，不常驻内存；否则保存在进程内字典中。
+    每个状态的大小约为 2 × 层数 × d_model × 窗口长度 × 4 字节（Kronos-small 约 20MB），
+    storage_dtype=torch.float16 可将磁盘占用减半。
+    """
+
+    def __init__(self, predictor: CS2SkinPredictor, state_dir: str = None, rebase_tol: float = 0.1, max_append: int = 30,
+                 storage_dtype: torch.dtype = None):
+        """
+        Args:
+            predictor (CS2SkinPredictor): 已加载模型的预测器
+            state_dir (str): 状态存盘目录，默认仅保存在内存中
+            rebase_tol (float): 归一化统计量漂移阈值（以建立状态时的标准差为单位）
+            max_append (int): 一次最多增量追加的行数，超过则重新构建
+            storage_dtype (torch.dtype): 存盘时浮点张量使用的类型，默认保持推理精度（见 CS2SkinPredictor 的 dtype）
+        """
+        self.predictor = predictor
+        self.state_dir = state_dir
+        self.rebase_tol = rebase_tol
+        self.max_append = max_append
+        self.storage_dtype = storage_dtype
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+        self._states = {}
+        self.stats = {"built": 0, "appended": 0, "unchanged": 0}
+
+    def _model_id(self):
+        return [self.predictor.model_name, self.predictor.tokenizer_name, self.predictor.quantize, self.predictor.dtype]
+
+    def _path(self, skin_id):
+        return os.path.join(self.state_dir, hashlib.sha1(str(skin_id).encode()).hexdigest() + ".pt")
+
+    def _load(self, skin_id):
+        if self.state_dir is None:
+            return self._states.get(skin_id)
+        try:
+            entry = torch.load(self._path(skin_id), weights_only=True)
+        except FileNotFoundError:
+            return None
+        # 模型、量化模式或推理精度不同的状态不能复用
+        if entry["model"] != self._model_id():
+            return None
+        return {
+            "state": SeriesState.from_dict(entry["state"], self.predictor.device, self.predictor.predictor.dtype),
+            "last_timestamp": pd.Timestamp(entry["last_timestamp"]),
+        }
+
+    def _save(self, skin_id, entry):
+        if self.state_dir is None:
+            self._states[skin_id] = entry
+            return
+        path = self._path(skin_id)
+        torch.save({
+            "model": self._model_id(),
+            "state": entry["state"].to_dict(self.storage_dtype),
+            "last_timestamp": str(entry["last_timestamp"]),
+        }, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _drifted(self, state):
+        scale = self.rebase_tol * (state.x_std + 1e-5)
+        return bool(np.any(np.abs(state.x.mean(axis=0) - state.x_mean) > scale)
+                    or np.any(np.abs(state.x.std(axis=0) - state.x_std) > scale))
+
+    def update(self, skin_id, df: pd.DataFrame):
+        """
+        用最新的历史数据更新某个皮肤的状态。
+
+        Args:
+            skin_id: 皮肤 ID
+            df (pd.DataFrame): 该皮肤的历史数据，格式同 CS2SkinPredictor.predict
+
+        Returns:
+            str: "appended"（增量追加）、"built"（重新构建）或 "unchanged"（没有新数据）
+        """
+        x, timestamps = self.predictor._prepare_inputs(df)
+        kronos = self.predictor.predictor
+        entry = self._load(skin_id)
+
+        if entry is not None:
+            n_new = int((timestamps > entry["last_timestamp"]).sum())
+            state = entry["state"]
+            if n_new == 0:
+                self.stats["unchanged"] += 1
+                return "unchanged"
+            # 只有在旧窗口的末尾与新数据对齐时才能增量追加
+            n_old = min(len(state), len(x) - n_new)
+            aligned = n_old > 0 and timestamps.iloc[-n_new - 1] == entry["last_timestamp"] \
+                and np.array_equal(state.x[-n_old:], x[len(x) - n_new - n_old:len(x) - n_new])
+            if n_new <= self.max_append and aligned:
+                stamps = calc_time_stamps(timestamps.iloc[-n_new:]).values.astype(np.float32)
+                for row, stamp in zip(x[-n_new:], stamps):
+                    kronos.append_state(state, row, stamp, max_len=HISTORY_LEN)
+                if not self._drifted(state):
+                    self._save(skin_id, {"state": state, "last_timestamp": timestamps.iloc[-1]})
+                    self.stats["appended"] += 1
+                    return "appended"
+
+        state = kronos.init_state(x, calc_time_stamps(timestamps).values.astype(np.float32))
+        self._save(skin_id, {"state": state, "last_timestamp": timestamps.iloc[-1]})
+        self.stats["built"] += 1
+        return "built"
+
+    def update_batch(self, df_long: pd.DataFrame, skin_id_col: str = "skin_id"):
+        """
+        按皮肤更新长格式数据中的所有状态，单个皮肤出错只跳过该皮肤。
+
+        Returns:
+            dict: 各皮肤的更新结果，见 update；失败的皮肤不在其中
+        """
+        results = {}
+        for skin_id, df in df_long.groupby(skin_id_col, sort=False):
+            try:
+                results[skin_id] = self.update(skin_id, df)
+            except Exception as e:
+                print(f"⚠️ 皮肤 {skin_id} 状态更新失败: {e}")
+        return results
+
+    def predict(self, skin_id, pred_days: int = 7, T: float = 0.8, top_p: float = 0.9, seed: int = None):
+        """
+        从已保存的状态直接预测，不重新处理历史窗口。
+
+        Args:
+            skin_id: 皮肤 ID，须先调用 update
+            pred_days, T, top_p, seed: 同 CS2SkinPredictor.predict
+
+        Returns:
+            pd.DataFrame: 预测结果，格式同 CS2SkinPredictor.predict
+        """
+        entry = self._load(skin_id)
+        if entry is None:
+            raise KeyError(f"皮肤 {skin_id} 没有已保存的状态，请先调用 update。")
+        y_timestamp = pd.date_range(start=entry["last_timestamp"] + pd.Timedelta(days=1), periods=pred_days, freq="D")
+        y_stamp = calc_time_stamps(pd.Series(y_timestamp)).values.astype(np.float32)
+        preds = self.predictor.predictor.forecast_state(
+            entry["state"], y_stamp, pred_days, T=T, top_p=top_p, sample_count=1,
+            seed=None if seed is None else derive_seed(seed, skin_id)
+        )
+        return pd.DataFrame(preds, columns=["open", "high", "low", "close", "volume", "amount"], index=y_timestamp)
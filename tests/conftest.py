@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+# 添加项目根目录以导入 model 与 src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import Kronos, KronosTokenizer
+from src.predictor import HISTORY_LEN, CS2SkinPredictor
+
+
+def make_tokenizer(seed=0):
+    """结构与 Kronos-Tokenizer-base 相同、尺寸缩小的随机权重 Tokenizer"""
+    torch.manual_seed(seed)
+    return KronosTokenizer(d_in=6, d_model=32, n_heads=4, ff_dim=64, n_enc_layers=2, n_dec_layers=2, ffn_dropout_p=0.0,
+                           attn_dropout_p=0.0, resid_dropout_p=0.0, s1_bits=6, s2_bits=6, beta=0.05, gamma0=1.0, gamma=1.1,
+                           zeta=0.05, group_size=4).eval()
+
+
+def make_model(seed=0, learn_te=False):
+    """结构与 Kronos-small 相同、尺寸缩小的随机权重模型"""
+    torch.manual_seed(seed)
+    return Kronos(s1_bits=6, s2_bits=6, n_layers=2, d_model=32, n_heads=4, ff_dim=64, ffn_dropout_p=0.0, attn_dropout_p=0.0,
+                  resid_dropout_p=0.0, token_dropout_p=0.0, learn_te=learn_te).eval()
+
+
+def make_series(lengths, pred_len, seed=0):
+    """长度各异的随机游走 OHLCVA 序列及日线时间特征，供 KronosPredictor.predict_arrays 使用"""
+    rng = np.random.default_rng(seed)
+    xs = [(10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, 6)), axis=0))).astype(np.float32) for n in lengths]
+    stamps = [np.stack([np.zeros(n), np.zeros(n), np.arange(n) % 7, np.arange(n) % 28 + 1, np.ones(n)], axis=-1).astype(np.float32)
+              for n in lengths]
+    y_stamps = [np.stack([np.zeros(pred_len), np.zeros(pred_len), np.arange(pred_len) % 7, np.arange(pred_len) + 1,
+                          np.ones(pred_len)], axis=-1).astype(np.float32)] * len(lengths)
+    return xs, stamps, y_stamps
+
+
+def make_predictor(cache=None, max_horizon=None):
+    """不经 from_pretrained，直接用随机权重的小模型构建 CS2SkinPredictor"""
+    return CS2SkinPredictor("test-model", "test-tokenizer", device="cpu", cache=cache, max_horizon=max_horizon,
+                            model=make_model(), tokenizer=make_tokenizer(), max_context=HISTORY_LEN + 16)
+
+
+def make_panel(num_skins=4, days=40, seed=0):
+    """长格式的多皮肤日线 OHLC 数据，第 i 个皮肤少 i 天历史"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(num_skins):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, days - i)))
+        parts.append(pd.DataFrame({
+            "skin_id": f"skin_{i}", "timestamps": pd.date_range("2024-01-01", periods=days - i, freq="D"),
+            "open": close, "high": close * 1.01, "low": close * 0.99, "close": close,
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+
+@pytest.fixture
+def tokenizer():
+    return make_tokenizer()
+
+
+@pytest.fixture
+def model():
+    return make_model()
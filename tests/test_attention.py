@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+from model.module import KVCache, MultiHeadAttentionWithRoPE, set_attention_backend
+
+BATCH_SIZE, SEQ_LEN, D_MODEL, N_HEADS = 4, 16, 32, 4
+
+
+def left_padding(seq_len):
+    """每条序列左侧填充 0 到 seq_len - 4 个位置，True 表示填充"""
+    pad = torch.tensor([0, 3, 8, seq_len - 4])
+    return torch.arange(seq_len)[None, :] < pad[:, None]
+
+
+def prefill(layer, x, mask):
+    return layer(x, key_padding_mask=mask)
+
+
+def cached_step(n_new):
+    """先缓存 SEQ_LEN - n_new 个位置，再一次解码 n_new 个位置"""
+    def run(layer, x, mask):
+        cache = KVCache()
+        n_cached = x.size(1) - n_new
+        layer(x[:, :n_cached], key_padding_mask=None if mask is None else mask[:, :n_cached], kv_cache=cache)
+        return layer(x[:, n_cached:], key_padding_mask=mask, kv_cache=cache)
+    return run
+
+
+@pytest.mark.parametrize("backend", ["sdpa", "cached_mask"])
+@pytest.mark.parametrize("case", [prefill, cached_step(1), cached_step(4)], ids=["prefill", "cached_single", "cached_multi"])
+@pytest.mark.parametrize("padded", [False, True])
+@torch.no_grad()
+def test_backend_matches_reference(backend, case, padded):
+    torch.manual_seed(0)
+    layer = MultiHeadAttentionWithRoPE(D_MODEL, N_HEADS).eval()
+    x = torch.randn(BATCH_SIZE, SEQ_LEN, D_MODEL)
+    mask = left_padding(SEQ_LEN) if padded else None
+
+    expected = case(set_attention_backend(layer, "reference"), x, mask)
+    out = case(set_attention_backend(layer, backend), x, mask)
+    # 预填充时最后一条序列的前 12 个查询位置只能看到填充的键，结果仍须是有限值
+    assert not out.isnan().any()
+    torch.testing.assert_close(out, expected, rtol=1e-5, atol=1e-5)
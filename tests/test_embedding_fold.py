@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from model.kronos import calc_time_stamps
+from model.module import HierarchicalEmbedding, TemporalEmbedding
+
+from conftest import make_model
+
+
+def time_stamps(freq, batch_size=2, seq_len=50):
+    timestamps = pd.Series(pd.date_range("2020-01-01", periods=batch_size * seq_len, freq=freq))
+    return torch.from_numpy(calc_time_stamps(timestamps).values.astype(np.float32)).reshape(batch_size, seq_len, 5)
+
+
+def assert_fold_matches(module, inputs):
+    module.eval()
+    with torch.no_grad():
+        expected = module(inputs)
+        module.fold()
+        folded = module(inputs)
+    torch.testing.assert_close(folded, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_hierarchical_embedding_fold():
+    torch.manual_seed(0)
+    module = HierarchicalEmbedding(6, 6, 32)
+    ids = [torch.randint(0, 2 ** 6, (2, 50)), torch.randint(0, 2 ** 6, (2, 50))]
+    assert_fold_matches(module, ids)
+    assert_fold_matches(module, [t[:, -1:] for t in ids])
+
+
+@pytest.mark.parametrize("learn_pe", [False, True])
+@pytest.mark.parametrize("freq", ["D", "37min"])
+def test_temporal_embedding_fold(learn_pe, freq):
+    torch.manual_seed(0)
+    assert_fold_matches(TemporalEmbedding(32, learn_pe), time_stamps(freq))
+
+
+def test_train_drops_folded_tables():
+    torch.manual_seed(0)
+    module = HierarchicalEmbedding(6, 6, 32).eval()
+    module.fold()
+    module.train()
+    assert module.folded_s1 is None and module.folded_s2 is None
+
+
+@pytest.mark.parametrize("learn_te", [False, True])
+def test_kronos_fold_embeddings(learn_te):
+    model = make_model(learn_te=learn_te)
+    s1, s2 = torch.randint(0, 2 ** 6, (2, 2, 50))
+    stamp = time_stamps("D")
+    with torch.no_grad():
+        expected = model.decode_s1(s1, s2, stamp)
+        model.fold_embeddings()
+        folded = model.decode_s1(s1, s2, stamp)
+    for a, b in zip(folded, expected):
+        torch.testing.assert_close(a, b, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,43 @@
+import os
+from unittest import mock
+
+import numpy as np
+
+from src.forecast_cache import ForecastCache
+
+
+def entry_bytes(tmp_path):
+    """单个 8x6 float32 结果在磁盘上的大小"""
+    cache = ForecastCache(cache_dir=str(tmp_path / "probe"))
+    cache.put("probe", np.zeros((8, 6), dtype=np.float32))
+    return os.path.getsize(cache._path("probe"))
+
+
+def test_disk_eviction_is_lru_without_listing_directory(tmp_path):
+    size = entry_bytes(tmp_path)
+    cache = ForecastCache(max_entries=1, cache_dir=str(tmp_path / "cache"), max_disk_mb=3.5 * size / 2 ** 20)
+    with mock.patch("os.listdir", side_effect=AssertionError("put 不应遍历缓存目录")):
+        for i in range(3):
+            cache.put(f"k{i}", np.full((8, 6), i, dtype=np.float32))
+        # 磁盘命中刷新 k0 的访问顺序，下一次写入淘汰的是 k1
+        assert cache.get("k0") is not None
+        cache.put("k3", np.full((8, 6), 3, dtype=np.float32))
+    files = {name[:-len(".npy")] for name in os.listdir(tmp_path / "cache")}
+    assert files == {"k0", "k2", "k3"}
+    assert cache._disk_bytes == 3 * size
+
+
+def test_disk_index_is_rebuilt_from_existing_files(tmp_path):
+    size = entry_bytes(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    cache = ForecastCache(cache_dir=cache_dir)
+    for i in range(3):
+        cache.put(f"k{i}", np.full((8, 6), i, dtype=np.float32))
+        os.utime(cache._path(f"k{i}"), (i, i))
+
+    reopened = ForecastCache(cache_dir=cache_dir, max_disk_mb=2.5 * size / 2 ** 20)
+    assert reopened._disk_bytes == 3 * size
+    # 超出上限后按修改时间淘汰最旧的文件
+    reopened.put("k3", np.full((8, 6), 3, dtype=np.float32))
+    assert sorted(name[:-len(".npy")] for name in os.listdir(cache_dir)) == ["k2", "k3"]
+    np.testing.assert_array_equal(reopened.get("k2"), np.full((8, 6), 2, dtype=np.float32))
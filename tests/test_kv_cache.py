@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import torch
+
+from model.kronos import auto_regressive_inference
+
+
+def inputs(batch_size, seq_len, pred_len, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    x = torch.randn(batch_size, seq_len, 6, generator=g)
+    days = torch.arange(seq_len + pred_len).float()
+    stamp = torch.stack([torch.zeros_like(days), torch.zeros_like(days), days % 7, days % 28 + 1, days // 28 % 12 + 1], dim=-1)
+    stamp = stamp.expand(batch_size, -1, -1)
+    return x, stamp[:, :seq_len], stamp[:, seq_len:]
+
+
+def run(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, use_cache, sample_count=1, **kwargs):
+    return auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, T=1.0, top_k=0, top_p=0.9,
+                                     sample_count=sample_count, use_cache=use_cache, seed=[7 + i for i in range(x.size(0))], **kwargs)
+
+
+@pytest.mark.parametrize("seq_len, pred_len", [(20, 8), (40, 12)])
+@pytest.mark.parametrize("sample_count", [1, 2])
+def test_cached_matches_full_recompute(tokenizer, model, seq_len, pred_len, sample_count):
+    # max_context=48: (20, 8) stays inside the window, (40, 12) slides it for the last steps
+    x, x_stamp, y_stamp = inputs(3, seq_len, pred_len)
+    expected = run(tokenizer, model, x, x_stamp, y_stamp, 48, pred_len, use_cache=False, sample_count=sample_count)
+    cached = run(tokenizer, model, x, x_stamp, y_stamp, 48, pred_len, use_cache=True, sample_count=sample_count, window_mode="exact")
+    np.testing.assert_allclose(cached, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_cached_matches_full_recompute_with_padding(tokenizer, model):
+    x, x_stamp, y_stamp = inputs(2, 40, 12)
+    padding_mask = torch.zeros(2, 40, dtype=torch.bool)
+    padding_mask[0, :15] = True
+    expected = run(tokenizer, model, x, x_stamp, y_stamp, 32, 12, use_cache=False, padding_mask=padding_mask)
+    cached = run(tokenizer, model, x, x_stamp, y_stamp, 32, 12, use_cache=True, padding_mask=padding_mask, window_mode="exact")
+    np.testing.assert_allclose(cached, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_approx_window_runs_past_max_context(tokenizer, model):
+    x, x_stamp, y_stamp = inputs(2, 40, 12)
+    preds = run(tokenizer, model, x, x_stamp, y_stamp, 32, 12, use_cache=True, window_mode="approx")
+    assert preds.shape == (2, 32, 6) and np.isfinite(preds).all()
@@ -0,0 +1,69 @@
+import copy
+
+import torch
+
+from model.module import RMSNorm
+
+from conftest import make_model, make_tokenizer
+
+
+def randomize_norms(module, seed=0):
+    """非单位的 RMSNorm 权重，折叠进投影后结果才会与未折叠的模型不同"""
+    g = torch.Generator().manual_seed(seed)
+    with torch.no_grad():
+        for m in module.modules():
+            if isinstance(m, RMSNorm):
+                m.weight.copy_(1 + 0.5 * torch.randn(m.weight.shape, generator=g))
+    return module
+
+
+def state(module):
+    return {name: tensor.clone() for name, tensor in module.state_dict().items()}
+
+
+@torch.no_grad()
+def test_model_optimize_matches_unfused():
+    model = randomize_norms(make_model(learn_te=True))
+    optimized = copy.deepcopy(model).optimize_for_inference()
+    assert optimized.dep_layer.norm.weight is None  # dep_layer.norm 折叠进了 head.proj_s2
+
+    g = torch.Generator().manual_seed(1)
+    s1_ids = torch.randint(0, 2 ** 6, (3, 20), generator=g)
+    s2_ids = torch.randint(0, 2 ** 6, (3, 20), generator=g)
+    days = torch.arange(20).float()
+    stamp = torch.stack([torch.zeros(20), torch.zeros(20), days % 7, days % 28 + 1, torch.ones(20)], dim=-1).expand(3, -1, -1)
+    padding_mask = torch.zeros(3, 20, dtype=torch.bool)
+    padding_mask[0, :5] = True
+
+    expected_logits, expected_context = model.decode_s1(s1_ids, s2_ids, stamp, padding_mask=padding_mask)
+    logits, context = optimized.decode_s1(s1_ids, s2_ids, stamp, padding_mask=padding_mask)
+    torch.testing.assert_close(logits, expected_logits, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(context, expected_context, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(optimized.decode_s2(context, s1_ids, padding_mask=padding_mask),
+                               model.decode_s2(expected_context, s1_ids, padding_mask=padding_mask), rtol=1e-4, atol=1e-4)
+
+    # 再次调用不再改动参数
+    before = state(optimized)
+    optimized.optimize_for_inference()
+    after = state(optimized)
+    assert before.keys() == after.keys()
+    for name in before:
+        torch.testing.assert_close(after[name], before[name], rtol=0, atol=0)
+
+
+@torch.no_grad()
+def test_tokenizer_optimize_matches_unfused():
+    tokenizer = randomize_norms(make_tokenizer())
+    optimized = copy.deepcopy(tokenizer).optimize_for_inference()
+
+    x = torch.randn(2, 24, 6, generator=torch.Generator().manual_seed(2))
+    torch.testing.assert_close(optimized.encode(x, half=True), tokenizer.encode(x, half=True), rtol=0, atol=0)
+    indices = tokenizer.encode(x, half=True)
+    torch.testing.assert_close(optimized.decode(indices, half=True), tokenizer.decode(indices, half=True), rtol=1e-4, atol=1e-4)
+
+    before = state(optimized)
+    optimized.optimize_for_inference()
+    after = state(optimized)
+    assert before.keys() == after.keys()
+    for name in before:
+        torch.testing.assert_close(after[name], before[name], rtol=0, atol=0)
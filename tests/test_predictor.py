@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.forecast_cache import ForecastCache
+from src.predictor import HISTORY_LEN
+
+from conftest import make_panel, make_predictor
+
+
+def test_sharded_predictions_fill_parent_cache():
+    panel = make_panel()
+    expected = make_predictor().predict_batch(panel, pred_days=3, seed=0)
+
+    cache = ForecastCache()
+    predictor = make_predictor(cache=cache, max_horizon=5)
+    first = predictor.predict_batch(panel, pred_days=3, seed=0, num_workers=2)
+    pd.testing.assert_frame_equal(first, expected)
+    assert cache.stats()["misses"] == panel["skin_id"].nunique()
+
+    second = predictor.predict_batch(panel, pred_days=3, seed=0, num_workers=2)
+    pd.testing.assert_frame_equal(second, expected)
+    assert cache.stats()["memory_hits"] == panel["skin_id"].nunique()
+
+
+def test_max_horizon_bound_follows_max_context():
+    predictor = make_predictor()
+    predictor.predictor.max_context = 512
+    predictor._check_max_horizon(512 - HISTORY_LEN)
+    with pytest.raises(ValueError):
+        predictor._check_max_horizon(512 - HISTORY_LEN + 1)
+
+    predictor.predictor.max_context = HISTORY_LEN + 10
+    predictor._check_max_horizon(10)
+    with pytest.raises(ValueError):
+        predictor._check_max_horizon(11)
+
+
+def test_fp32_batch_matches_single_predictions():
+    # 各皮肤历史长度不同，整批预测时有 padding：采样的 token 相同，数值只差浮点舍入
+    panel = make_panel()
+    predictor = make_predictor()
+    batch = predictor.predict_batch(panel, pred_days=5, seed=0)
+    for skin_id, df in panel.groupby("skin_id"):
+        alone = predictor.predict(df, pred_days=5, seed=0, skin_id=skin_id)
+        expected = batch[batch["skin_id"] == skin_id][alone.columns].to_numpy()
+        np.testing.assert_allclose(alone.to_numpy(), expected, rtol=1e-5, atol=0)
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from model import profiler
+from model.profiler import Profiler, stage
+
+
+def test_memory_is_opt_in():
+    with mock.patch.object(profiler, "_reset_peak_rss") as reset, Profiler() as prof:
+        with stage("generate"):
+            with stage("decode_s1"):
+                pass
+    reset.assert_not_called()
+    assert prof.summary()["generate"]["peak_rss_mb"] is None
+
+
+def test_memory_only_measured_on_top_level_stages():
+    with mock.patch.object(profiler, "_reset_peak_rss") as reset, Profiler(track_memory=True) as prof:
+        for _ in range(2):
+            with stage("generate"):
+                for _ in range(5):
+                    with stage("decode_s1"):
+                        pass
+    # 每个顶层阶段只重置一次峰值，嵌套的解码步不读写 /proc
+    assert reset.call_count == (2 if prof.track_memory else 0)
+    summary = prof.summary()
+    assert summary["decode_s1"]["calls"] == 10
+    assert summary["decode_s1"]["peak_rss_mb"] is None
+    if prof.track_memory:
+        assert summary["generate"]["peak_rss_mb"] > 0
@@ -0,0 +1,16 @@
+import numpy as np
+
+from model import KronosPredictor
+
+from conftest import make_model, make_series, make_tokenizer
+
+
+def test_int8_forecast_does_not_depend_on_batch():
+    predictor = KronosPredictor(make_model(), make_tokenizer(), device="cpu", max_context=64, quantize="int8")
+    xs, stamps, y_stamps = make_series([30, 45, 60], pred_len=5)
+    seeds = [1, 2, 3]
+
+    batch = predictor.predict_arrays(xs, stamps, y_stamps, 5, seed=seeds)
+    for i in range(len(xs)):
+        alone = predictor.predict_arrays(xs[i:i + 1], stamps[i:i + 1], y_stamps[i:i + 1], 5, seed=seeds[i])[0]
+        np.testing.assert_array_equal(batch[i], alone)
@@ -0,0 +1,32 @@
+import pytest
+import torch
+
+from model.module import BSQuantizer
+
+
+@pytest.mark.parametrize("half", [False, True])
+def test_indices_match_forward(half):
+    torch.manual_seed(0)
+    quantizer = BSQuantizer(s1_bits=6, s2_bits=6, beta=0.05, gamma0=1.0, gamma=1.1, zeta=0.05, group_size=4).eval()
+    z = torch.randn(4, 50, 12)
+    z[0, :5] = 0  # 零值与负值一样量化为 -1
+
+    _, quantized, expected = quantizer(z, half=half)
+    indices = quantizer.indices(z, half=half)
+
+    if half:
+        assert all(torch.equal(a, b) for a, b in zip(indices, expected))
+    else:
+        assert torch.equal(indices, expected)
+        assert torch.equal(indices, quantizer.bits_to_indices(quantized))
+
+
+def test_tokenizer_encode_matches_forward(tokenizer):
+    x = torch.randn(3, 40, 6)
+    z = tokenizer.embed(x)
+    for layer in tokenizer.encoder:
+        z = layer(z)
+    _, _, expected = tokenizer.tokenizer(tokenizer.quant_embed(z), half=True)
+
+    indices = tokenizer.encode(x, half=True)
+    assert all(torch.equal(a, b) for a, b in zip(indices, expected))
@@ -0,0 +1,57 @@
+import torch
+import torch.nn.functional as F
+
+from model.kronos import NUCLEUS_CANDIDATES, sample_from_logits, top_k_top_p_filtering
+
+
+def sort_filter(logits, top_k=0, top_p=1.0, filter_value=-float("Inf")):
+    """改写前基于全词表排序的过滤（标量参数，top_k 优先），作为逐行对照"""
+    if top_k > 0:
+        top_k = min(top_k, logits.size(-1))
+        logits[logits < torch.topk(logits, top_k)[0][..., -1, None]] = filter_value
+    elif top_p < 1.0:
+        sorted_logits, sorted_indices = torch.sort(logits, descending=True)
+        cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
+        sorted_indices_to_remove = cumulative_probs > top_p
+        sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
+        sorted_indices_to_remove[..., 0] = 0
+        logits[sorted_indices_to_remove.scatter(1, sorted_indices, sorted_indices_to_remove)] = filter_value
+    return logits
+
+
+def test_mixed_per_row_settings_match_sort_filter():
+    logits = torch.randn(6, 1024, generator=torch.Generator().manual_seed(0)) * 3
+    top_k = torch.tensor([0, 5, 0, 0, 50, 0])
+    top_p = torch.tensor([0.9, 0.5, 0.99, 1.0, 0.3, 0.7])
+
+    filtered = top_k_top_p_filtering(logits.clone(), top_k=top_k, top_p=top_p)
+    for i in range(len(logits)):
+        expected = sort_filter(logits[i:i + 1].clone(), int(top_k[i]), float(top_p[i]))
+        torch.testing.assert_close(filtered[i:i + 1], expected, rtol=0, atol=0)
+
+
+def test_flat_nucleus_larger_than_candidates():
+    logits = torch.randn(2, 1024, generator=torch.Generator().manual_seed(1)) * 1e-3
+    filtered = top_k_top_p_filtering(logits.clone(), top_p=0.9)
+
+    expected = sort_filter(logits.clone(), top_p=0.9)
+    torch.testing.assert_close(filtered, expected, rtol=0, atol=0)
+    assert (torch.isfinite(filtered).sum(-1) > NUCLEUS_CANDIDATES).all()
+
+
+def test_greedy_returns_argmax():
+    logits = torch.randn(4, 100, generator=torch.Generator().manual_seed(2))
+    x = sample_from_logits(logits, temperature=torch.tensor([0.5, 1.0, 1.5, 2.0]), top_k=torch.tensor([0, 3, 0, 10]),
+                           top_p=0.9, sample_logits=False)
+    assert x.shape == (4, 1)
+    torch.testing.assert_close(x[:, 0], logits.argmax(-1))
+
+
+def test_inverse_cdf_never_picks_filtered_token():
+    # 非零概率的词分别在词表开头和末尾；float64 的 1 - 1e-12 转为 float32 后为 1.0，逆 CDF 会越过最后一个非零概率的词
+    logits = torch.stack([torch.linspace(5, -5, 256), torch.linspace(-5, 5, 256)]).repeat(4, 1)
+    uniform = torch.tensor([0.0, 0.0, 0.5, 0.5, 1 - 2 ** -24, 1 - 2 ** -24, 1 - 1e-12, 1 - 1e-12], dtype=torch.float64)
+    for top_k, top_p in ((3, None), (None, 0.5), (1, None)):
+        probs = F.softmax(top_k_top_p_filtering(logits.clone(), top_k=top_k or 0, top_p=top_p or 1.0), dim=-1)
+        x = sample_from_logits(logits.clone(), top_k=top_k, top_p=top_p, uniform=uniform)
+        assert (probs.gather(-1, x) > 0).all()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import torch
+
+from model import KronosPredictor
+from model.kronos import SeriesState
+from src.state_store import SkinStateStore
+
+from conftest import make_model, make_panel, make_predictor, make_series, make_tokenizer
+
+PRED_LEN = 5
+
+
+@pytest.fixture
+def predictor():
+    return KronosPredictor(make_model(learn_te=True), make_tokenizer(), device="cpu", max_context=64)
+
+
+@pytest.mark.parametrize("sample_count", [1, 3])
+def test_forecast_state_matches_predict_arrays(predictor, sample_count):
+    xs, stamps, y_stamps = make_series([40], PRED_LEN)
+    expected = predictor.predict_arrays(xs, stamps, y_stamps, PRED_LEN, sample_count=sample_count, seed=11)[0]
+
+    state = predictor.init_state(xs[0], stamps[0])
+    out = predictor.forecast_state(state, y_stamps[0], PRED_LEN, sample_count=sample_count, seed=11)
+    np.testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-4)
+    # forecast_state 不改动状态，再次预测结果相同
+    np.testing.assert_array_equal(predictor.forecast_state(state, y_stamps[0], PRED_LEN, sample_count=sample_count, seed=11), out)
+
+
+@pytest.mark.parametrize("storage_dtype", [None, torch.float16])
+def test_state_disk_round_trip(predictor, tmp_path, storage_dtype):
+    xs, stamps, y_stamps = make_series([40], PRED_LEN)
+    state = predictor.init_state(xs[0], stamps[0])
+    torch.save(state.to_dict(storage_dtype), tmp_path / "state.pt")
+    loaded = SeriesState.from_dict(torch.load(tmp_path / "state.pt", weights_only=True), "cpu", predictor.dtype)
+
+    np.testing.assert_array_equal(loaded.x, state.x)
+    assert [len(c) for c in loaded._caches()] == [len(c) for c in state._caches()]
+    assert all(c.k.dtype == predictor.dtype for c in loaded._caches())
+    for cache, original in zip(loaded._caches(), state._caches()):
+        tol = 0 if storage_dtype is None else 1e-2
+        torch.testing.assert_close(cache.k, original.k, rtol=tol, atol=tol)
+
+    expected = predictor.forecast_state(state, y_stamps[0], PRED_LEN, seed=3)
+    out = predictor.forecast_state(loaded, y_stamps[0], PRED_LEN, seed=3)
+    if storage_dtype is None:
+        np.testing.assert_array_equal(out, expected)
+    else:
+        assert out.shape == expected.shape and np.isfinite(out).all()
+
+
+def test_append_state_evicts_past_max_len(predictor):
+    xs, stamps, _ = make_series([45], PRED_LEN)
+    state = predictor.init_state(xs[0][:40], stamps[0][:40])
+    for row, stamp in zip(xs[0][40:], stamps[0][40:]):
+        predictor.append_state(state, row, stamp, max_len=42)
+
+    assert len(state) == 42
+    np.testing.assert_array_equal(state.x, xs[0][-42:])
+    assert all(t.size(1) == 42 for t in state.tokens)
+    assert all(len(c) == 42 and c.start_pos == 3 for c in state.enc_cache + state.kv_cache + state.dec_cache)
+    # 交叉注意力缓存不含最后一个位置
+    assert len(state.cross_cache) == 41
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_store_update_outcomes(tmp_path, on_disk):
+    skin_predictor = make_predictor()
+    store = SkinStateStore(skin_predictor, state_dir=str(tmp_path) if on_disk else None,
+                           storage_dtype=torch.float16 if on_disk else None)
+    df = make_panel(num_skins=1, days=41)
+    history = df.iloc[:40]
+
+    assert store.update("skin_0", history) == "built"
+    np.testing.assert_allclose(store.predict("skin_0", pred_days=PRED_LEN, seed=0).to_numpy(),
+                               skin_predictor.predict(history, pred_days=PRED_LEN, seed=0, skin_id="skin_0").to_numpy(),
+                               rtol=1e-2 if on_disk else 1e-4, atol=1e-2 if on_disk else 1e-4)
+    assert store.update("skin_0", history) == "unchanged"
+    assert store.update("skin_0", df) == "appended"
+
+    # 修改过的历史不能增量追加
+    edited = make_panel(num_skins=1, days=42).copy()
+    edited.loc[5, "close"] *= 1.5
+    assert store.update("skin_0", edited) == "built"
+
+    # 一次大幅跳变使窗口统计量漂移，重新构建
+    jumped = make_panel(num_skins=1, days=43).copy()
+    jumped.loc[42, ["open", "high", "low", "close"]] *= 20
+    assert store.update("skin_0", jumped) == "built"
+    assert store.stats == {"built": 3, "appended": 1, "unchanged": 1}
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from model import KronosPredictor
+
+from conftest import make_model, make_series, make_tokenizer
+
+MAX_CONTEXT = 64
+
+
+@pytest.mark.parametrize("lengths, pred_len", [
+    ([30, 45, 57], 5),  # 左填充的批次
+    ([60], 5),  # seq_len + pred_len - 1 == max_context，静态缓存恰好填满
+])
+def test_static_steps_match_dynamic(lengths, pred_len):
+    predictor = KronosPredictor(make_model(learn_te=True), make_tokenizer(), device="cpu", max_context=MAX_CONTEXT)
+    xs, stamps, y_stamps = make_series(lengths, pred_len)
+    seeds = list(range(len(lengths)))
+    expected = predictor.predict_arrays(xs, stamps, y_stamps, pred_len, sample_count=2, seed=seeds)
+
+    # 未编译的 decode_s1/decode_s2 作为 step_fns，走与 compile_decode=True 相同的静态形状路径
+    calls = []
+
+    def decode_s1(*args, **kwargs):
+        calls.append(kwargs["padding_mask"].shape)
+        return predictor.model.decode_s1(*args, **kwargs)
+
+    predictor.step_fns = (decode_s1, predictor.model.decode_s2)
+    static = predictor.predict_arrays(xs, stamps, y_stamps, pred_len, sample_count=2, seed=seeds)
+
+    assert len(calls) == pred_len - 1
+    assert all(shape[-1] == MAX_CONTEXT for shape in calls)
+    for out, ref in zip(static, expected):
+        np.testing.assert_allclose(out, ref, rtol=1e-5, atol=1e-5)